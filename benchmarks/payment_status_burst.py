@@ -0,0 +1,71 @@
+"""
+    Burst of Tegro Money notifications against a running server.
+    Compares the sync and the async payment_status views under an ASGI server, e.g. uvicorn,
+    run it with TEGRO_MONEY_ASYNC_VIEWS = False and True in settings.py:
+
+        uvicorn mysite.asgi:application
+        python benchmarks/payment_status_burst.py http://127.0.0.1:8000/payment_status/ SHOP 1 -n 2000 -c 500
+
+    Uses only the standard library.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def notify(host, port, path, body, latencies, errors):
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        writer.close()
+        if b' 200 ' not in status_line:
+            errors.append(status_line)
+    except OSError as e:
+        errors.append(e)
+    latencies.append(time.monotonic() - started)
+
+
+async def burst(url, shop_id, order_id, requests, concurrency, status=None):
+    parts = urlsplit(url)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def limited(status):
+        body = json.dumps({'shop_id': shop_id, 'order_id': order_id, 'status': status}).encode()
+        async with semaphore:
+            await notify(parts.hostname, parts.port or 80, parts.path, body, latencies, errors)
+
+    started = time.monotonic()
+    await asyncio.gather(*(limited(i % 2 if status is None else status) for i in range(requests)))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    print(f'requests: {requests}, concurrency: {concurrency}, errors: {len(errors)}')
+    print(f'elapsed: {elapsed:.2f}s, throughput: {requests / elapsed:.0f} req/s')
+    print(f'latency: median {statistics.median(latencies) * 1000:.1f}ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('shop_id')
+    parser.add_argument('order_id', type=int)
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=200)
+    parser.add_argument('-s', '--status', type=int, help='Send repeated notifications with this status, '
+                                                         'by default the status alternates between 0 and 1')
+    args = parser.parse_args()
+    asyncio.run(burst(args.url, args.shop_id, args.order_id, args.requests, args.concurrency, args.status))
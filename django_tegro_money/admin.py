@@ -1,9 +1,19 @@
 from django.contrib import admin
 
 from django_tegro_money.models import *
+from django_tegro_money.routers import get_read_database
 
 
-class TegroMoneyOrderAdmin(admin.ModelAdmin):
+class ReplicaReadAdmin(admin.ModelAdmin):
+    """
+        Read-only admin reading from the replica of the tegro tables
+    """
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).using(get_read_database())
+
+
+class TegroMoneyOrderAdmin(ReplicaReadAdmin):
     list_display = ['shop_id', 'order_id', 'payment_id', 'date_created', 'date_payed', 'payment_system',
                     'currency', 'currency_id', 'amount', 'fee', 'status', 'test_order']
     list_display_links = tuple()
@@ -27,7 +37,7 @@ class TegroMoneyOrderAdmin(admin.ModelAdmin):
 admin.site.register(TegroMoneyOrder, TegroMoneyOrderAdmin)
 
 
-class TegroMoneyOrderFieldsAdmin(admin.ModelAdmin):
+class TegroMoneyOrderFieldsAdmin(ReplicaReadAdmin):
     list_display = ['order', 'field_name', 'field_value']
     list_display_links = tuple()
     search_fields = ('order', 'field_name', 'field_value')
@@ -47,7 +57,7 @@ class TegroMoneyOrderFieldsAdmin(admin.ModelAdmin):
 admin.site.register(TegroMoneyOrderFields, TegroMoneyOrderFieldsAdmin)
 
 
-class TegroMoneyOrderReceiptAdmin(admin.ModelAdmin):
+class TegroMoneyOrderReceiptAdmin(ReplicaReadAdmin):
     list_display = ['order', 'name', 'count', 'price']
     list_display_links = tuple()
     search_fields = ('order', 'name', 'count', 'price')
@@ -66,3 +76,40 @@ class TegroMoneyOrderReceiptAdmin(admin.ModelAdmin):
 
 admin.site.register(TegroMoneyOrderReceipt, TegroMoneyOrderReceiptAdmin)
 
+
+class TegroMoneyLedgerAdmin(ReplicaReadAdmin):
+    list_display = ['shop_id', 'currency', 'balance', 'offset', 'orders_count', 'date_checkpoint']
+    list_display_links = tuple()
+    fields = ('shop_id', 'currency', 'balance', 'offset', 'orders_count', 'date_checkpoint')
+    list_filter = ('shop_id', 'currency')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(TegroMoneyLedger, TegroMoneyLedgerAdmin)
+
+
+class TegroMoneyReconciliationAdmin(ReplicaReadAdmin):
+    list_display = ['shop_id', 'currency', 'date_checked', 'ledger_balance', 'api_balance', 'drift']
+    list_display_links = tuple()
+    fields = ('shop_id', 'currency', 'date_checked', 'ledger_balance', 'api_balance', 'drift')
+    list_filter = ('shop_id', 'currency', 'date_checked')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(TegroMoneyReconciliation, TegroMoneyReconciliationAdmin)
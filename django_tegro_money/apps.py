@@ -5,3 +5,10 @@ class DjangoTegroMoneyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_tegro_money'
     verbose_name = 'Django Tegro Money'
+
+    def ready(self):
+        from django_tegro_money.routers import check_router
+        check_router()
+
+        # Connect signal receivers
+        from django_tegro_money import notifications  # noqa: F401
@@ -0,0 +1,50 @@
+"""
+    ASGI application serving the long-poll of payment statuses in front of the Django request handler.
+    Django runs the request_started and request_finished receivers of every request to an async view
+    in a thread of the request, so every client waiting in wait_payment_status holds an idle thread.
+    Served by this application, the long-poll only awaits the status waiters. In asgi.py of the project:
+
+        from django.core.asgi import get_asgi_application
+        from django_tegro_money.asgi import with_wait_payment_status
+
+        application = with_wait_payment_status(get_asgi_application())
+
+    Requests other than GET of wait_payment_status are passed to the wrapped application.
+"""
+
+import json
+
+from django.http import QueryDict
+from django.urls import reverse
+
+
+def with_wait_payment_status(application):
+    """
+        Wraps the Django ASGI application, the apps must be loaded already (get_asgi_application())
+    """
+    from django_tegro_money.views import wait_for_payment_status
+
+    wait_path = None
+
+    async def wait_payment_status_application(scope, receive, send):
+        nonlocal wait_path
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            if wait_path is None:
+                wait_path = reverse('wait_payment_status')
+            path = scope['path']
+            root_path = scope.get('root_path', '')
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            if path == wait_path:
+                status, data = await wait_for_payment_status(QueryDict(scope['query_string'].decode('latin-1')))
+                body = json.dumps(data).encode('utf-8')
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+                })
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        await application(scope, receive, send)
+
+    return wait_payment_status_application
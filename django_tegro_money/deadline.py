@@ -0,0 +1,46 @@
+"""
+    Deadlines of Tegro Money API calls.
+    A deadline is an absolute time.monotonic() value. It is passed to TegroMoney methods explicitly
+    or taken from the context variable, which is set per HTTP request by DeadlineMiddleware.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_deadline = ContextVar('tegro_money_deadline', default=None)
+
+
+def get_deadline(deadline=None):
+    """
+        Returns the explicit deadline or the deadline of the current context, None if there is no deadline
+    """
+    if deadline is not None:
+        return deadline
+    return current_deadline.get()
+
+
+def remaining(deadline):
+    """
+        Returns the time remaining to the deadline in seconds, None if there is no deadline
+    """
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_after(seconds):
+    """
+        Sets the deadline of the current context in the given number of seconds.
+        A nested deadline can't be later than the outer one.
+    """
+    deadline = time.monotonic() + seconds
+    outer = current_deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
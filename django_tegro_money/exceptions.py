@@ -21,3 +21,10 @@ class FailedRequestError(Exception):
             f"Request → {request}."
         )
 
+
+class DeadlineExceededError(FailedRequestError):
+    """
+    Exception raised when the deadline of the request has been reached before the API responded.
+
+    Attributes are the same as for FailedRequestError.
+    """
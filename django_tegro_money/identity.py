@@ -0,0 +1,210 @@
+"""
+    Identity cache of orders.
+    Maps Tegro Money order_id and shop payment_id to the primary key and the current status of TegroMoneyOrder.
+    The identity by order_id never changes, so it is kept in a bounded in-process LRU over the Django cache.
+    payment_id isn't unique, so its identity is only kept in the Django cache and dropped whenever an order
+    with this payment_id is cached, the next lookup checks it is still unique.
+    The status is only kept in the Django cache, which is shared by all workers. It is dropped when an order is saved
+    or deleted and set by the order_status_changed signal, so repeated notifications are answered from the cache.
+    Writes bypassing the model signals (QuerySet.update(), bulk_update()) must call invalidate(), otherwise
+    the cached status is stale until the timeout. Writes still compare the status in SQL.
+"""
+
+import hashlib
+from collections import namedtuple
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from django_tegro_money.models import TegroMoneyOrder
+from django_tegro_money.settings import TEGRO_MONEY_CACHE_ALIAS, TEGRO_MONEY_STATUS_CACHE_TIMEOUT, \
+    TEGRO_MONEY_IDENTITY_CACHE_SIZE
+from django_tegro_money.utils import LRUCache
+
+OrderIdentity = namedtuple('OrderIdentity', ['pk', 'status'])
+
+IDENTITY_CACHE_KEY = 'tegro_money:order:{shop_id}:{field}:{value}'
+STATUS_CACHE_KEY = 'tegro_money:order_status:{pk}'
+
+
+class OrderIdentityCache:
+
+    def __init__(self, cache_alias='default', timeout=86400, maxsize=10000):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.local = LRUCache(maxsize)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def identity_key(field, shop_id, value) -> str:
+        if field == 'payment_id':
+            # Payment id is an arbitrary string of the shop, not every cache backend accepts it in keys
+            value = hashlib.md5(str(value).encode('utf-8')).hexdigest()
+        return IDENTITY_CACHE_KEY.format(shop_id=shop_id, field=field, value=value)
+
+    @staticmethod
+    def status_key(pk) -> str:
+        return STATUS_CACHE_KEY.format(pk=pk)
+
+    def _order_id_key(self, order):
+        if order.order_id is not None:
+            return self.identity_key('order_id', order.shop_id, order.order_id)
+        return None
+
+    def _payment_id_key(self, order):
+        if order.payment_id is not None:
+            return self.identity_key('payment_id', order.shop_id, order.payment_id)
+        return None
+
+    def _query(self, field, shop_id, value):
+        return TegroMoneyOrder.objects.filter(shop_id=shop_id, **{field: value}).values_list('pk', 'status')[:2]
+
+    def set(self, order, status=None):
+        """
+            Caches the identity and the status of the order
+        """
+        status = order.status if status is None else status
+        values = {self.status_key(order.pk): status}
+        order_id_key = self._order_id_key(order)
+        if order_id_key:
+            self.local.set(order_id_key, order.pk)
+            values[order_id_key] = order.pk
+        self.cache.set_many(values, self.timeout)
+        payment_id_key = self._payment_id_key(order)
+        if payment_id_key:
+            # Another order may have the same payment_id now
+            self.cache.delete(payment_id_key)
+
+    def set_status(self, pk, status):
+        self.cache.set(self.status_key(pk), status, self.timeout)
+
+    def invalidate(self, order):
+        """
+            Removes the order from the cache, e.g. when it has been changed bypassing the signals
+        """
+        keys = [key for key in (self._order_id_key(order), self._payment_id_key(order)) if key]
+        for key in keys:
+            self.local.delete(key)
+        self.cache.delete_many(keys + [self.status_key(order.pk)])
+
+    def _get(self, field, shop_id, value):
+        key = self.identity_key(field, shop_id, value)
+        local = field == 'order_id'
+        pk = self.local.get(key) if local else None
+        if pk is None:
+            pk = self.cache.get(key)
+        status = None if pk is None else self.cache.get(self.status_key(pk))
+
+        if status is None:
+            # Not cached yet, or payment_id isn't unique
+            rows = list(self._query(field, shop_id, value))
+            if len(rows) != 1:
+                return None
+            pk, status = rows[0]
+            self.cache.set(key, pk, self.timeout)
+            # add() doesn't overwrite a status set in the meantime
+            self.cache.add(self.status_key(pk), status, self.timeout)
+
+        if local:
+            self.local.set(key, pk)
+        return OrderIdentity(pk, status)
+
+    async def _aget(self, field, shop_id, value):
+        key = self.identity_key(field, shop_id, value)
+        local = field == 'order_id'
+        pk = self.local.get(key) if local else None
+        if pk is None:
+            pk = await self.cache.aget(key)
+        status = None if pk is None else await self.cache.aget(self.status_key(pk))
+
+        if status is None:
+            rows = [row async for row in self._query(field, shop_id, value)]
+            if len(rows) != 1:
+                return None
+            pk, status = rows[0]
+            await self.cache.aset(key, pk, self.timeout)
+            await self.cache.aadd(self.status_key(pk), status, self.timeout)
+
+        if local:
+            self.local.set(key, pk)
+        return OrderIdentity(pk, status)
+
+    def get_by_order_id(self, shop_id, order_id):
+        """
+            Returns OrderIdentity(pk, status) by Tegro Money order id, None if the order is not found
+        """
+        return self._get('order_id', shop_id, order_id)
+
+    def get_many_by_order_id(self, shop_id, order_ids) -> dict:
+        """
+            Returns {order_id: OrderIdentity(pk, status)} of the orders found, with one get_many per cache level
+            and one query for the orders not cached yet
+        """
+        keys = {order_id: self.identity_key('order_id', shop_id, order_id) for order_id in order_ids}
+        pks = {}
+        for order_id, key in keys.items():
+            pk = self.local.get(key)
+            if pk is not None:
+                pks[order_id] = pk
+        cached = self.cache.get_many([key for order_id, key in keys.items() if order_id not in pks])
+        for order_id, key in keys.items():
+            if order_id not in pks and cached.get(key) is not None:
+                pks[order_id] = cached[key]
+                self.local.set(key, cached[key])
+        statuses = self.cache.get_many([self.status_key(pk) for pk in pks.values()])
+
+        identities = {}
+        for order_id, pk in pks.items():
+            status = statuses.get(self.status_key(pk))
+            if status is not None:
+                identities[order_id] = OrderIdentity(pk, status)
+
+        missing = [order_id for order_id in keys if order_id not in identities]
+        if missing:
+            rows = {}
+            for order_id, pk, status in TegroMoneyOrder.objects.filter(shop_id=shop_id, order_id__in=missing) \
+                    .values_list('order_id', 'pk', 'status'):
+                rows.setdefault(order_id, []).append((pk, status))
+            for order_id, found in rows.items():
+                if len(found) != 1:
+                    continue
+                pk, status = found[0]
+                key = keys[order_id]
+                self.local.set(key, pk)
+                self.cache.set(key, pk, self.timeout)
+                self.cache.add(self.status_key(pk), status, self.timeout)
+                identities[order_id] = OrderIdentity(pk, status)
+        return identities
+
+    def get_by_payment_id(self, shop_id, payment_id):
+        """
+            Returns OrderIdentity(pk, status) by order id of the shop, None if the order is not found or not unique
+        """
+        return self._get('payment_id', shop_id, payment_id)
+
+    async def aget_by_order_id(self, shop_id, order_id):
+        return await self._aget('order_id', shop_id, order_id)
+
+
+order_identity = OrderIdentityCache(
+    cache_alias=TEGRO_MONEY_CACHE_ALIAS,
+    timeout=TEGRO_MONEY_STATUS_CACHE_TIMEOUT,
+    maxsize=TEGRO_MONEY_IDENTITY_CACHE_SIZE,
+)
+
+
+@receiver(post_save, sender=TegroMoneyOrder)
+def invalidate_saved_order(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not {'status', 'order_id', 'payment_id'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: order_identity.invalidate(instance), using=using)
+
+
+@receiver(post_delete, sender=TegroMoneyOrder)
+def invalidate_deleted_order(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: order_identity.invalidate(instance), using=using)
@@ -0,0 +1,77 @@
+from argparse import ArgumentTypeError
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from django_tegro_money.reconciliation import Reconciler
+
+
+def since(value):
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValueError
+            parsed = datetime.combine(date, time.min)
+    except ValueError:
+        raise ArgumentTypeError(f'invalid date: {value!r}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = 'Compares the balance of Tegro Money with the ledger of paid orders and reports drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drill-down', action='store_true',
+                            help='Check orders of the time window where drift has appeared with check_order')
+        parser.add_argument('--since', type=since,
+                            help='Start of the drill-down window (YYYY-MM-DD or an ISO datetime) '
+                                 'if there has been no reconciliation without drift')
+        parser.add_argument('--accept', action='store_true',
+                            help='Accept the remaining drift (e.g. withdrawals) as the offset of the ledger')
+        parser.add_argument('--sync', action='store_true',
+                            help='Update statuses of local orders with all orders of get_orders first')
+        parser.add_argument('--batch-size', type=int, default=100, help='Orders per batch')
+
+    def handle(self, *args, **options):
+        reconciler = Reconciler(batch_size=options['batch_size'])
+
+        if options['sync']:
+            for order, field, local_value, api_value in reconciler.sync_orders():
+                self.stdout.write(f'order {order.order_id} ({order.payment_id}): {field} {local_value} -> {api_value}')
+
+        checked = reconciler.fill_fees()
+        posted = reconciler.update_ledger()
+        self.stdout.write(f'Orders checked: {checked}, posted to ledger: {posted}')
+
+        results = reconciler.reconcile()
+        drifted = [result for result in results if result.drift]
+
+        if drifted and options['drill_down']:
+            for result in drifted:
+                date_from, date_to = reconciler.drift_window(result)
+                date_from = date_from or options['since']
+                if date_from is None:
+                    self.stdout.write(self.style.WARNING(
+                        f'{result.currency}: there has been no reconciliation without drift, '
+                        f'pass --since to check orders'))
+                    continue
+                self.stdout.write(f'{result.currency}: checking orders from {date_from} to {date_to}')
+                for order, field, local_value, api_value in reconciler.drill_down(result.currency, date_from, date_to):
+                    self.stdout.write(f'  order {order.order_id} ({order.payment_id}): {field} '
+                                      f'{local_value} -> {api_value}')
+            results = reconciler.reconcile()
+            drifted = [result for result in results if result.drift]
+
+        for result in results:
+            message = f'{result.currency}: balance {result.api_balance:f}, ledger {result.ledger_balance:f}, ' \
+                      f'drift {result.drift:f}'
+            self.stdout.write(self.style.WARNING(message) if result.drift else self.style.SUCCESS(message))
+
+        if drifted and options['accept']:
+            for result in drifted:
+                reconciler.accept(result)
+            self.stdout.write(f'Drift accepted: {", ".join(result.currency for result in drifted)}')
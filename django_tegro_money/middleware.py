@@ -0,0 +1,27 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django_tegro_money.deadline import deadline_after
+from django_tegro_money.settings import TEGRO_MONEY_REQUEST_BUDGET
+
+
+class DeadlineMiddleware:
+    """
+        Sets the deadline of Tegro Money API calls made while handling the request
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with deadline_after(TEGRO_MONEY_REQUEST_BUDGET):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with deadline_after(TEGRO_MONEY_REQUEST_BUDGET):
+            return await self.get_response(request)
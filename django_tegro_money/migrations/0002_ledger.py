@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_tegro_money', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TegroMoneyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop_id', models.CharField(max_length=50, verbose_name='Shop identifier')),
+                ('currency', models.CharField(max_length=10, verbose_name='Currency')),
+                ('balance', models.DecimalField(decimal_places=8, default=0, max_digits=19, verbose_name='Balance of paid orders')),
+                ('offset', models.DecimalField(decimal_places=8, default=0, max_digits=19, verbose_name='Accepted difference')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Orders posted')),
+                ('date_checkpoint', models.DateTimeField(blank=True, null=True, verbose_name='Last posting time')),
+            ],
+            options={
+                'verbose_name': 'Ledger',
+                'verbose_name_plural': 'Ledgers',
+                'ordering': ['shop_id', 'currency'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TegroMoneyReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop_id', models.CharField(max_length=50, verbose_name='Shop identifier')),
+                ('currency', models.CharField(max_length=10, verbose_name='Currency')),
+                ('date_checked', models.DateTimeField(verbose_name='Time checked')),
+                ('ledger_balance', models.DecimalField(decimal_places=8, max_digits=19, verbose_name='Ledger balance with offset')),
+                ('api_balance', models.DecimalField(decimal_places=8, max_digits=19, verbose_name='Tegro money balance')),
+                ('drift', models.DecimalField(decimal_places=8, max_digits=19, verbose_name='Drift')),
+            ],
+            options={
+                'verbose_name': 'Reconciliation',
+                'verbose_name_plural': 'Reconciliations',
+                'ordering': ['shop_id', 'currency', 'date_checked'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tegromoneyorder',
+            name='ledger_amount',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=19, null=True, verbose_name='Amount posted to ledger'),
+        ),
+        migrations.AlterField(
+            model_name='tegromoneyorder',
+            name='status',
+            field=models.IntegerField(blank=True, default=-1, null=True, verbose_name='Order status'),
+        ),
+        migrations.AlterField(
+            model_name='tegromoneyorder',
+            name='test_order',
+            field=models.IntegerField(blank=True, default=0, null=True, verbose_name='Test order flag'),
+        ),
+        migrations.AddIndex(
+            model_name='tegromoneyorder',
+            index=models.Index(fields=['shop_id', 'status', 'ledger_amount'], name='order_status_ledger'),
+        ),
+        migrations.AddIndex(
+            model_name='tegromoneyorder',
+            index=models.Index(fields=['shop_id', 'date_payed'], name='order_payed'),
+        ),
+        migrations.AddConstraint(
+            model_name='tegromoneyledger',
+            constraint=models.UniqueConstraint(fields=('shop_id', 'currency'), name='ledger_shop_currency'),
+        ),
+        migrations.AddIndex(
+            model_name='tegromoneyreconciliation',
+            index=models.Index(fields=['shop_id', 'currency', 'date_checked'], name='reconciliation_checked'),
+        ),
+    ]
@@ -18,6 +18,8 @@ class TegroMoneyOrder(models.Model):
     fee = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Fee', null=True, blank=True)
     status = models.IntegerField(verbose_name='Order status', null=True, blank=True, default=-1)
     test_order = models.IntegerField(verbose_name='Test order flag', null=True, blank=True, default=0)
+    ledger_amount = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Amount posted to ledger',
+                                        null=True, blank=True)
 
     def __str__(self):
         return self.payment_id
@@ -31,6 +33,8 @@ class TegroMoneyOrder(models.Model):
             Index(fields=['shop_id', 'order_id'], name='order_order_id'),
             Index(fields=['shop_id', 'payment_id'], name='order_payment_id'),
             Index(fields=['shop_id', 'status', 'date_created'], name='order_status_created'),
+            Index(fields=['shop_id', 'status', 'ledger_amount'], name='order_status_ledger'),
+            Index(fields=['shop_id', 'date_payed'], name='order_payed'),
         )
 
 
@@ -61,3 +65,48 @@ class TegroMoneyOrderReceipt(models.Model):
         verbose_name = 'Order shopping cart data'
         verbose_name_plural = 'Order shopping cart data'
         ordering = ['order']
+
+
+class TegroMoneyLedger(models.Model):
+    """
+        Running ledger of paid orders
+    """
+    shop_id = models.CharField(max_length=50, verbose_name='Shop identifier')
+    currency = models.CharField(max_length=10, verbose_name='Currency')
+    balance = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Balance of paid orders',
+                                  default=0)
+    offset = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Accepted difference',
+                                 default=0)
+    orders_count = models.IntegerField(verbose_name='Orders posted', default=0)
+    date_checkpoint = models.DateTimeField(verbose_name='Last posting time', null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.shop_id} {self.currency}'
+
+    class Meta:
+        verbose_name = 'Ledger'
+        verbose_name_plural = 'Ledgers'
+        ordering = ['shop_id', 'currency']
+        constraints = (
+            models.UniqueConstraint(fields=['shop_id', 'currency'], name='ledger_shop_currency'),
+        )
+
+
+class TegroMoneyReconciliation(models.Model):
+    """
+        Comparisons of the ledger with the balance of Tegro Money
+    """
+    shop_id = models.CharField(max_length=50, verbose_name='Shop identifier')
+    currency = models.CharField(max_length=10, verbose_name='Currency')
+    date_checked = models.DateTimeField(verbose_name='Time checked')
+    ledger_balance = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Ledger balance with offset')
+    api_balance = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Tegro money balance')
+    drift = models.DecimalField(max_digits=19, decimal_places=8, verbose_name='Drift')
+
+    class Meta:
+        verbose_name = 'Reconciliation'
+        verbose_name_plural = 'Reconciliations'
+        ordering = ['shop_id', 'currency', 'date_checked']
+        indexes = (
+            Index(fields=['shop_id', 'currency', 'date_checked'], name='reconciliation_checked'),
+        )
@@ -0,0 +1,166 @@
+"""
+    Fan-out of order status changes to waiting clients.
+    The current status of an order is published to the identity cache (shared by all workers through the Django cache)
+    and to the waiters of the process, which are woken at once. Changes made by other workers are picked up by a single
+    poller thread of the process reading the statuses of all waited orders with one get_many per poll interval,
+    so waiting coroutines only await their future: no thread, cache request or query per waiter.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from django.core import signing
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from django_tegro_money.identity import order_identity
+from django_tegro_money.models import TegroMoneyOrder
+from django_tegro_money.settings import TEGRO_MONEY_WAIT_POLL_INTERVAL
+from django_tegro_money.signals import order_status_changed
+
+WAIT_TOKEN_SALT = 'django_tegro_money.wait_payment_status'
+
+logger = logging.getLogger(__name__)
+
+
+def make_wait_token(order_id) -> str:
+    """
+        Returns the token the client passes to the waiting views instead of the guessable order id
+    """
+    return signing.Signer(salt=WAIT_TOKEN_SALT).sign(str(order_id))
+
+
+def read_wait_token(token) -> int:
+    """
+        Returns the order id of the token, raises signing.BadSignature if the token is forged
+    """
+    return int(signing.Signer(salt=WAIT_TOKEN_SALT).unsign(token))
+
+
+class OrderStatusWaiters:
+    """
+        Coroutines of the process waiting for a status of an order other than the known one.
+        Publishing is thread-safe, so sync views running in worker threads and the poller thread
+        can wake coroutines waiting on any event loop of the process.
+    """
+
+    def __init__(self, poll_interval=1):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # {(shop_id, order_id): {future: (loop, known status)}}
+        self._waiters = {}
+        # Orders waited for since the last poll, their current status is read at once
+        self._new = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def publish(self, shop_id, order_id, status):
+        """
+            Wakes the waiters of the order which known status differs, status None means the order is not found
+        """
+        self._resolve({(shop_id, order_id): status})
+
+    def _resolve(self, statuses):
+        resolved = []
+        with self._lock:
+            for key, status in statuses.items():
+                for future, (loop, known_status) in self._waiters.get(key, {}).items():
+                    if status is None or status != known_status:
+                        resolved.append((future, loop, status))
+        for future, loop, status in resolved:
+            try:
+                loop.call_soon_threadsafe(self._set_result, future, status)
+            except RuntimeError:
+                # The loop of the waiter has been closed already
+                pass
+
+    @staticmethod
+    def _set_result(future, value):
+        if not future.done():
+            future.set_result(value)
+
+    async def wait(self, shop_id, order_id, known_status, timeout):
+        """
+            Waits until the status of the order differs from the known one (None - any status).
+            Returns the status, None if the order is not found. Raises asyncio.TimeoutError on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (shop_id, order_id)
+        with self._lock:
+            self._waiters.setdefault(key, {})[future] = (loop, known_status)
+            self._new.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tegro-money-status-poller', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.pop(future, None)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def _run(self):
+        last_poll = 0
+        while True:
+            self._wakeup.wait(self.poll_interval if self._waiters else None)
+            self._wakeup.clear()
+            with self._lock:
+                if time.monotonic() - last_poll >= self.poll_interval:
+                    keys = list(self._waiters)
+                    last_poll = time.monotonic()
+                else:
+                    keys = [key for key in self._new if key in self._waiters]
+                self._new.clear()
+            if not keys:
+                continue
+            try:
+                self._resolve(self._poll(keys))
+            except Exception:
+                logger.exception('Statuses of waited orders are not read')
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def _poll(keys) -> dict:
+        order_ids = {}
+        for shop_id, order_id in keys:
+            order_ids.setdefault(shop_id, []).append(order_id)
+        statuses = {}
+        for shop_id, shop_order_ids in order_ids.items():
+            identities = order_identity.get_many_by_order_id(shop_id, shop_order_ids)
+            for order_id in shop_order_ids:
+                identity = identities.get(order_id)
+                statuses[(shop_id, order_id)] = None if identity is None else identity.status
+        return statuses
+
+
+status_waiters = OrderStatusWaiters(poll_interval=TEGRO_MONEY_WAIT_POLL_INTERVAL)
+
+
+def publish_order_status(order, status):
+    """
+        Publishes the current status of the order to the cache and to local waiters
+    """
+    order_identity.set(order, status)
+    if order.order_id is not None:
+        status_waiters.publish(order.shop_id, order.order_id, status)
+
+
+async def wait_order_status(shop_id, order_id, known_status, timeout):
+    """
+        Waits until the status of the order differs from the known one (None - any status).
+        Returns the status, None if the order is not found. Raises asyncio.TimeoutError on timeout.
+    """
+    return await status_waiters.wait(shop_id, order_id, known_status, timeout)
+
+
+@receiver(order_status_changed, sender=TegroMoneyOrder)
+def publish_order_status_changed(sender, instance, old_status, new_status, **kwargs):
+    publish_order_status(instance, new_status)
@@ -0,0 +1,222 @@
+"""
+    Outbound rate limiter for Tegro Money API requests.
+    The limiter is a sliding window counter: every limit allows burst requests per window of burst / rate seconds.
+    Requests are counted per fixed window in the Django cache with cache.add() / cache.incr(), and the count
+    of the previous window is weighted by its overlap with the sliding one, so no more than about burst requests
+    pass in any window, also across window boundaries.
+    The counters hold across all worker processes only with a cache backend which incr() is atomic and shared
+    (Redis, Memcached). It is not atomic on the database and file based caches, so they are refused, and the local
+    memory cache limits every process separately.
+    There is a limit per shop and, optionally, a limit per endpoint of the shop.
+    Background requests may only use a share of the shop limit, the rest is reserved for checkout.
+"""
+
+import threading
+import time
+import warnings
+
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+PRIORITY_CHECKOUT = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+# Share of the shop limit available for the priority class
+PRIORITY_SHARES = {
+    PRIORITY_CHECKOUT: 1.0,
+    PRIORITY_DEFAULT: 0.8,
+    PRIORITY_BACKGROUND: 0.5,
+}
+
+ENDPOINT_PRIORITIES = {
+    'createOrder/': PRIORITY_CHECKOUT,
+    'order/': PRIORITY_BACKGROUND,
+    'orders/': PRIORITY_BACKGROUND,
+}
+
+RATE_LIMIT_CACHE_KEY = 'tegro_money:rate_limit:{bucket}:{slot}'
+
+
+class RateLimiterMetrics:
+    """
+        In-process metrics of the rate limiter per endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _endpoint(self, endpoint):
+        return self._metrics.setdefault(endpoint, {
+            'requests': 0,
+            'waiting': 0,
+            'waited': 0,
+            'rejected': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        })
+
+    def enter(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint)['waiting'] += 1
+
+    def leave(self, endpoint, wait_time, acquired):
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['waiting'] -= 1
+            metrics['requests'] += 1
+            if not acquired:
+                metrics['rejected'] += 1
+            if wait_time > 0:
+                metrics['waited'] += 1
+                metrics['wait_time'] += wait_time
+                metrics['max_wait_time'] = max(metrics['max_wait_time'], wait_time)
+
+    def snapshot(self) -> dict:
+        """
+            Returns metrics per endpoint:
+                requests (int): Requests passed through the limiter
+                waiting (int): Requests waiting for the limiter now (queue length)
+                waited (int): Requests delayed by the limiter
+                rejected (int): Requests failed after max waiting time
+                wait_time (float): Total waiting time, seconds
+                max_wait_time (float): Max waiting time, seconds
+        """
+        with self._lock:
+            return {endpoint: dict(metrics) for endpoint, metrics in self._metrics.items()}
+
+
+class RateLimiter:
+    """
+        Shared sliding window rate limiter
+    """
+
+    def __init__(self, cache_alias='default', rate_limit=None, endpoint_rate_limits=None, max_wait=10):
+        self.cache_alias = cache_alias
+        self.rate_limit = self._validate(rate_limit)
+        self.endpoint_rate_limits = {endpoint: self._validate(limit, endpoint)
+                                     for endpoint, limit in (endpoint_rate_limits or {}).items()}
+        self.max_wait = max_wait
+        self.metrics = RateLimiterMetrics()
+        if self.rate_limit or any(self.endpoint_rate_limits.values()):
+            self._check_cache()
+
+    def _check_cache(self):
+        cache = caches[self.cache_alias]
+        if isinstance(cache, (DatabaseCache, FileBasedCache, DummyCache)):
+            raise ImproperlyConfigured(f"Rate limit requires a cache backend with atomic incr() (Redis, Memcached), "
+                                       f"the cache '{self.cache_alias}' is {type(cache).__name__}")
+        if isinstance(cache, LocMemCache):
+            warnings.warn(f"The cache '{self.cache_alias}' of the rate limit is local memory, "
+                          f"every process is limited separately", RuntimeWarning)
+
+    @staticmethod
+    def _validate(limit, endpoint=None):
+        if not limit:
+            return None
+        name = f'Rate limit of {endpoint}' if endpoint else 'Rate limit'
+        try:
+            rate, burst = limit['rate'], limit['burst']
+        except (KeyError, TypeError):
+            raise ImproperlyConfigured(f"{name} must be a dict with 'rate' and 'burst': {limit!r}")
+        if not isinstance(rate, (int, float)) or rate <= 0:
+            raise ImproperlyConfigured(f"{name}: 'rate' must be a positive number: {rate!r}")
+        if not isinstance(burst, int) or burst < 1:
+            raise ImproperlyConfigured(f"{name}: 'burst' must be a positive integer: {burst!r}")
+        return limit
+
+    @staticmethod
+    def priority(endpoint) -> int:
+        return ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_DEFAULT)
+
+    def _take(self, bucket, limit, capacity):
+        """
+            Counts a request in the bucket if the limit allows it.
+            Returns (cache key of the count, 0) on success, otherwise (None, time to wait).
+        """
+        cache = caches[self.cache_alias]
+        window = limit['burst'] / limit['rate']
+        now = time.time()
+        slot = int(now // window)
+        key = RATE_LIMIT_CACHE_KEY.format(bucket=bucket, slot=slot)
+        # The count is read as the previous one during the next window
+        cache.add(key, 0, 2 * window + 1)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # The key has expired between add() and incr()
+            cache.add(key, 0, 2 * window + 1)
+            count = cache.incr(key)
+        previous = cache.get(RATE_LIMIT_CACHE_KEY.format(bucket=bucket, slot=slot - 1)) or 0
+        elapsed = now - slot * window
+        if count + previous * (1 - elapsed / window) <= capacity:
+            return key, 0
+
+        self._give_back(key)
+        if count > capacity:
+            wait = (slot + 1) * window - now
+        else:
+            # Until the weight of the previous window leaves room for the request
+            wait = window * (1 - (capacity - count) / previous) - elapsed
+        return None, max(wait, 0.001)
+
+    def _give_back(self, key):
+        try:
+            caches[self.cache_alias].decr(key)
+        except ValueError:
+            pass
+
+    def _try_acquire(self, shop_id, endpoint, priority) -> float:
+        """
+            Counts the request in the shop and the endpoint buckets. Returns 0 on success, otherwise time to wait.
+        """
+        shop_key = None
+        if self.rate_limit:
+            capacity = int(self.rate_limit['burst'] * PRIORITY_SHARES[priority]) or 1
+            shop_key, wait = self._take(shop_id, self.rate_limit, capacity)
+            if wait:
+                return wait
+        endpoint_limit = self.endpoint_rate_limits.get(endpoint)
+        if endpoint_limit:
+            endpoint_key, wait = self._take(f'{shop_id}:{endpoint}', endpoint_limit, endpoint_limit['burst'])
+            if wait:
+                if shop_key:
+                    self._give_back(shop_key)
+                return wait
+        return 0
+
+    def acquire(self, shop_id, endpoint, priority=None, max_wait=None):
+        """
+            Waits until the limits allow a request to the endpoint.
+            Returns waiting time in seconds, None if the request is not allowed within max waiting time.
+        """
+        if not self.rate_limit and not any(self.endpoint_rate_limits.values()):
+            return 0
+
+        if priority is None:
+            priority = self.priority(endpoint)
+
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        acquired = False
+        waited = 0
+        self.metrics.enter(endpoint)
+        try:
+            while True:
+                wait = self._try_acquire(shop_id, endpoint, priority)
+                if not wait:
+                    acquired = True
+                    return waited
+                # Lower priorities wake up later, so checkout requests take the freed capacity first
+                wait += 0.01 * (priority + 1)
+                if time.monotonic() + wait > deadline:
+                    return None
+                time.sleep(wait)
+                waited = time.monotonic() - started
+        finally:
+            self.metrics.leave(endpoint, waited, acquired)
@@ -0,0 +1,244 @@
+"""
+    Reconciliation of the balance of Tegro Money with paid orders.
+    The running ledger per currency is the sum of amount minus fee of paid orders, test orders excluded.
+    It is maintained incrementally: every order keeps the amount it has posted to the ledger (ledger_amount),
+    so only orders paid, corrected or cancelled since the previous run are read.
+    Fees and payment times of paid orders are filled by check_order.
+    The ledger is compared with get_balance, and if a drift appears, orders of the time window since
+    the last reconciliation without drift are checked with check_order in batches.
+    Statuses of all orders can be synchronized with get_orders, local orders are found through the identity cache.
+"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from django_tegro_money.exceptions import FailedRequestError
+from django_tegro_money.identity import order_identity
+from django_tegro_money.models import TegroMoneyOrder, TegroMoneyLedger, TegroMoneyReconciliation
+from django_tegro_money.settings import TEGRO_MONEY_SHOP_ID, TEGRO_MONEY_DATABASE, TEGRO_MONEY_PAID_STATUS, \
+    TEGRO_MONEY_PAYMENT_LOOKBACK
+from django_tegro_money.signals import send_order_status_changed
+from django_tegro_money.tegro_money import TegroMoney
+
+
+class Reconciler:
+
+    def __init__(self, tegro_money: TegroMoney = None, shop_id: str = None, batch_size: int = 100):
+        self.tegro_money = tegro_money or TegroMoney()
+        self.shop_id = shop_id or TEGRO_MONEY_SHOP_ID
+        self.batch_size = batch_size
+        self.logger = self.tegro_money.logger
+
+    def _orders(self):
+        return TegroMoneyOrder.objects.using(TEGRO_MONEY_DATABASE).filter(shop_id=self.shop_id)
+
+    def _ledger(self, currency) -> TegroMoneyLedger:
+        ledger, created = TegroMoneyLedger.objects.using(TEGRO_MONEY_DATABASE).select_for_update() \
+            .get_or_create(shop_id=self.shop_id, currency=currency)
+        return ledger
+
+    def _check_orders(self, orders) -> list:
+        """
+            Updates the orders with check_order. Posted orders which net amount has changed are reposted.
+            Returns the list of differences: (order, field, local value, Tegro Money value)
+        """
+        differences = []
+        for order in orders:
+            try:
+                remote = self.tegro_money.fetch_order(order_id=order.order_id)
+            except FailedRequestError as e:
+                self.logger.error(f"Order {order.order_id} is not checked: {e.message}")
+                continue
+            differences += self._update_order(order, remote)
+        return differences
+
+    def _update_order(self, order, remote) -> list:
+        """
+            Updates the order with the Order of Tegro Money, reposts it if its net amount has changed.
+            Returns the list of differences: (order, field, local value, Tegro Money value)
+        """
+        differences = []
+        old_status = order.status
+        fields = [('status', remote.status), ('amount', remote.amount), ('fee', remote.fee),
+                  ('date_payed', remote.date_payed)]
+        if order.order_id is None:
+            # Found by payment_id
+            fields.append(('order_id', remote.id))
+        for field, value in fields:
+            if value is not None and getattr(order, field) != value:
+                differences.append((order, field, getattr(order, field), value))
+                setattr(order, field, value)
+        if not differences:
+            return differences
+
+        with transaction.atomic(using=TEGRO_MONEY_DATABASE):
+            if order.ledger_amount is not None and order.status == TEGRO_MONEY_PAID_STATUS \
+                    and order.fee is not None and order.ledger_amount != order.amount - order.fee:
+                ledger = self._ledger(order.currency)
+                ledger.balance += order.amount - order.fee - order.ledger_amount
+                ledger.save()
+                order.ledger_amount = order.amount - order.fee
+            order.save(update_fields=['order_id', 'status', 'amount', 'fee', 'date_payed', 'ledger_amount'])
+            transaction.on_commit(lambda o=order, s=old_status: send_order_status_changed(o, s, o.status),
+                                  using=TEGRO_MONEY_DATABASE)
+        return differences
+
+    def sync_orders(self, orders=None) -> list:
+        """
+            Updates local orders with the orders of Tegro Money (iter_all_orders by default).
+            Local orders are found in the identity cache by order_id, or by payment_id if the order_id isn't known
+            locally yet. Orders which cached status is the same are skipped without a query: their amounts and fees
+            are checked by fill_fees and drill_down. Returns the list of differences like drill_down.
+        """
+        differences = []
+        for remote in self.tegro_money.iter_all_orders() if orders is None else orders:
+            identity = order_identity.get_by_order_id(self.shop_id, remote.id)
+            if identity is None:
+                if remote.payment_id is None:
+                    continue
+                identity = order_identity.get_by_payment_id(self.shop_id, remote.payment_id)
+                if identity is None:
+                    continue
+            elif identity.status == remote.status:
+                continue
+
+            order = self._orders().filter(pk=identity.pk).first()
+            # An order found by payment_id may belong to another order of Tegro Money with the same payment_id
+            if order is None or order.order_id not in (None, remote.id):
+                continue
+            differences += self._update_order(order, remote)
+
+        # Post orders which have become paid or not paid
+        self.update_ledger()
+        return differences
+
+    def fill_fees(self) -> int:
+        """
+            Fills fees and payment times of paid orders with check_order. Returns the number of orders checked.
+        """
+        orders = self._orders().exclude(test_order=1).filter(status=TEGRO_MONEY_PAID_STATUS, fee__isnull=True,
+                                                              order_id__isnull=False).order_by('pk')
+        count = 0
+        last_pk = 0
+        while True:
+            # Orders which fee is still unknown are left for the next run
+            batch = list(orders.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                return count
+            self._check_orders(batch)
+            count += len(batch)
+            last_pk = batch[-1].pk
+
+    def update_ledger(self) -> int:
+        """
+            Posts paid orders to the ledger and removes orders which are not paid any more.
+            Test orders are never posted. Returns the number of orders posted or removed.
+        """
+        count = 0
+        while True:
+            with transaction.atomic(using=TEGRO_MONEY_DATABASE):
+                orders = list(self._orders().select_for_update().filter(currency__isnull=False).filter(
+                    (Q(status=TEGRO_MONEY_PAID_STATUS, fee__isnull=False, ledger_amount__isnull=True) &
+                     ~Q(test_order=1)) |
+                    (Q(ledger_amount__isnull=False) & (~Q(status=TEGRO_MONEY_PAID_STATUS) | Q(test_order=1)))
+                ).order_by('pk')[:self.batch_size])
+                if not orders:
+                    return count
+
+                deltas = {}
+                for order in orders:
+                    delta, posted = deltas.get(order.currency, (Decimal(0), 0))
+                    if order.ledger_amount is None:
+                        order.ledger_amount = order.amount - order.fee
+                        deltas[order.currency] = (delta + order.ledger_amount, posted + 1)
+                    else:
+                        deltas[order.currency] = (delta - order.ledger_amount, posted - 1)
+                        order.ledger_amount = None
+                TegroMoneyOrder.objects.using(TEGRO_MONEY_DATABASE).bulk_update(orders, ['ledger_amount'])
+
+                now = datetime.now(timezone.utc)
+                for currency, (delta, posted) in deltas.items():
+                    ledger = self._ledger(currency)
+                    ledger.balance += delta
+                    ledger.orders_count += posted
+                    ledger.date_checkpoint = now
+                    ledger.save()
+
+            count += len(orders)
+
+    def reconcile(self) -> list:
+        """
+            Compares the ledger with the balance of Tegro Money and saves the result per currency.
+            Returns the list of TegroMoneyReconciliation.
+        """
+        balance = self.tegro_money.fetch_balance().balance or {}
+        now = datetime.now(timezone.utc)
+        ledgers = {ledger.currency: ledger
+                   for ledger in TegroMoneyLedger.objects.using(TEGRO_MONEY_DATABASE).filter(shop_id=self.shop_id)}
+
+        results = []
+        for currency in sorted(set(balance) | set(ledgers)):
+            ledger = ledgers.get(currency)
+            ledger_balance = ledger.balance + ledger.offset if ledger else Decimal(0)
+            api_balance = balance.get(currency, Decimal(0))
+            results.append(TegroMoneyReconciliation(
+                shop_id=self.shop_id,
+                currency=currency,
+                date_checked=now,
+                ledger_balance=ledger_balance,
+                api_balance=api_balance,
+                drift=api_balance - ledger_balance,
+            ))
+        TegroMoneyReconciliation.objects.using(TEGRO_MONEY_DATABASE).bulk_create(results)
+        return results
+
+    def drift_window(self, result: TegroMoneyReconciliation) -> tuple:
+        """
+            Returns the time window where the drift has appeared: since the last reconciliation without drift.
+            The start is None if there has been no reconciliation without drift, it must be chosen explicitly.
+        """
+        last_good = TegroMoneyReconciliation.objects.using(TEGRO_MONEY_DATABASE) \
+            .filter(shop_id=self.shop_id, currency=result.currency, drift=0, date_checked__lt=result.date_checked) \
+            .order_by('-date_checked').values_list('date_checked', flat=True).first()
+        return last_good, result.date_checked
+
+    def drill_down(self, currency, date_from, date_to=None) -> list:
+        """
+            Checks orders of the currency paid in the time window, or created in it or TEGRO_MONEY_PAYMENT_LOOKBACK
+            before it (they may have been paid in the window without notification), with check_order in batches.
+            The window must have a start: checking the whole history is a full scan with a request per order.
+            Returns the list of differences: (order, field, local value, Tegro Money value)
+        """
+        if date_from is None:
+            raise ValueError('date_from is required')
+        window = Q(date_created__gte=date_from - timedelta(seconds=TEGRO_MONEY_PAYMENT_LOOKBACK)) | \
+            Q(date_payed__gte=date_from)
+        if date_to is not None:
+            window &= Q(date_created__lte=date_to) | Q(date_payed__lte=date_to)
+        orders = self._orders().exclude(test_order=1).filter(window, currency=currency, order_id__isnull=False) \
+            .order_by('pk')
+
+        differences = []
+        last_pk = 0
+        while True:
+            batch = list(orders.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                break
+            differences += self._check_orders(batch)
+            last_pk = batch[-1].pk
+
+        # Post orders which have become paid or not paid
+        self.update_ledger()
+        return differences
+
+    def accept(self, result: TegroMoneyReconciliation):
+        """
+            Accepts the drift, e.g. withdrawals, as the offset of the ledger
+        """
+        with transaction.atomic(using=TEGRO_MONEY_DATABASE):
+            ledger = self._ledger(result.currency)
+            ledger.offset += result.drift
+            ledger.save()
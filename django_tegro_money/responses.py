@@ -0,0 +1,237 @@
+"""
+    Typed records of Tegro Money API responses and incremental decoding of large responses.
+    Records keep parsed values only: amounts as Decimal, dates as aware datetimes.
+    The dict of the API is rebuilt on demand as a normalized view, so records may be used where dicts were used before.
+"""
+
+import codecs
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+from django_tegro_money.settings import TEGRO_MONEY_API_TIMEZONE
+
+API_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+API_TIMEZONE = ZoneInfo(TEGRO_MONEY_API_TIMEZONE)
+
+
+def parse_decimal(value):
+    return Decimal(str(value))
+
+
+def format_decimal(value):
+    return str(value)
+
+
+def parse_datetime(value):
+    return datetime.strptime(value, API_DATETIME_FORMAT).replace(tzinfo=API_TIMEZONE)
+
+
+def format_datetime(value):
+    return value.astimezone(API_TIMEZONE).strftime(API_DATETIME_FORMAT)
+
+
+def parse_balance(value):
+    # An empty balance is sent as an empty JSON array
+    if isinstance(value, list) and not value:
+        return {}
+    if not isinstance(value, dict):
+        raise TypeError(f'Balance must be an object, not {type(value).__name__}')
+    return {currency: parse_decimal(amount) for currency, amount in value.items()}
+
+
+def format_balance(value):
+    return {currency: format_decimal(amount) for currency, amount in value.items()}
+
+
+DECIMAL = (parse_decimal, format_decimal)
+DATETIME = (parse_datetime, format_datetime)
+
+
+class Record:
+    """
+        Base of response records. Subclasses list their fields in __slots__,
+        fields which need conversion are listed in _types as {name: (parser, formatter)}.
+        Values which can't be converted and unknown keys are kept as is in extra.
+    """
+    __slots__ = ('extra', '_absent')
+    _types = {}
+    _field_names = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_names = tuple(name for klass in reversed(cls.__mro__)
+                                 for name in klass.__dict__.get('__slots__', ()) if name not in ('extra', '_absent'))
+
+    def __init__(self, raw: dict):
+        self.extra = None
+        self._absent = frozenset(name for name in self._field_names if name not in raw)
+        for name in self._field_names:
+            value = raw.get(name)
+            if value is not None and value != '' and name in self._types:
+                try:
+                    value = self._types[name][0](value)
+                except (ValueError, TypeError, InvalidOperation):
+                    self._set_extra(name, value)
+                    value = None
+            setattr(self, name, value)
+        for name, value in raw.items():
+            if name not in self._field_names:
+                self._set_extra(name, value)
+
+    def _set_extra(self, name, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[name] = value
+
+    @property
+    def raw(self) -> dict:
+        """
+            The dict as returned by the API, normalized: keys which were absent are left out,
+            but amounts are always strings and dates are in the API format, whatever JSON type was received
+        """
+        raw = {}
+        for name in self._field_names:
+            if name in self._absent:
+                continue
+            value = getattr(self, name)
+            if value is not None and name in self._types:
+                value = self._types[name][1](value)
+            raw[name] = value
+        if self.extra:
+            raw.update(self.extra)
+        return raw
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.raw == other.raw
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self._field_names)})"
+
+
+class Order(Record):
+    __slots__ = ('id', 'date_created', 'date_payed', 'status', 'payment_system_id', 'currency_id',
+                 'amount', 'fee', 'email', 'test_order', 'payment_id')
+    _types = {
+        'date_created': DATETIME,
+        'date_payed': DATETIME,
+        'amount': DECIMAL,
+        'fee': DECIMAL,
+    }
+
+
+class Shop(Record):
+    __slots__ = ('id', 'date_added', 'name', 'url', 'status', 'public_key', 'desc')
+    _types = {
+        'date_added': DATETIME,
+    }
+
+
+class Balance(Record):
+    __slots__ = ('user_id', 'balance')
+    _types = {
+        'balance': (parse_balance, format_balance),
+    }
+
+
+class StreamingDecoder:
+    """
+        Incremental decoder of a JSON object with a large array, e.g. {"type": ..., "desc": ..., "data": [...]}.
+        Items of the array are decoded one by one while chunks are read, the other members are kept in fields.
+    """
+
+    def __init__(self, chunks, array_key='data'):
+        self.chunks = iter(chunks)
+        self.array_key = array_key
+        self.fields = {}
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self._eof = True
+            chunk = b''
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk, final=self._eof)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._read():
+                return
+
+    def _char(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise json.JSONDecodeError('Unexpected end of data', self._buffer, self._pos)
+        return self._buffer[self._pos]
+
+    def _expect(self, char):
+        if self._char() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self._buffer, self._pos)
+        self._pos += 1
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read()
+
+    def __iter__(self):
+        """
+            Yields items of the array
+        """
+        self._expect('{')
+        if self._char() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == self.array_key and self._char() == '[':
+                self._pos += 1
+                if self._char() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._char() == ']':
+                            self._pos += 1
+                            break
+                        self._expect(',')
+            else:
+                self.fields[key] = self._value()
+            if self._char() == '}':
+                self._pos += 1
+                return
+            self._expect(',')
@@ -0,0 +1,98 @@
+"""
+    Database router of the tegro tables.
+    The tables are placed on TEGRO_MONEY_DATABASE. Reads are routed to TEGRO_MONEY_REPLICA_DATABASE
+    only when asked for (admin, reports, exports), writes and all other reads stay on the primary.
+    After a write the reads of the same context stick to the primary for TEGRO_MONEY_REPLICA_STICKY_SECONDS.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router
+
+from django_tegro_money.settings import TEGRO_MONEY_DATABASE, TEGRO_MONEY_REPLICA_DATABASE, \
+    TEGRO_MONEY_REPLICA_STICKY_SECONDS
+
+APP_LABEL = 'django_tegro_money'
+
+_replica_reads = ContextVar('tegro_money_replica_reads', default=False)
+_last_write = ContextVar('tegro_money_last_write', default=None)
+
+
+def mark_written():
+    """
+        Sticks the reads of the current context to the primary database
+    """
+    _last_write.set(time.monotonic())
+
+
+def is_sticky() -> bool:
+    last_write = _last_write.get()
+    return last_write is not None and time.monotonic() - last_write < TEGRO_MONEY_REPLICA_STICKY_SECONDS
+
+
+def get_read_database() -> str:
+    """
+        Returns the database alias for replica-tolerant reads of the tegro tables
+    """
+    if TEGRO_MONEY_REPLICA_DATABASE and not is_sticky():
+        return TEGRO_MONEY_REPLICA_DATABASE
+    return TEGRO_MONEY_DATABASE
+
+
+def check_router():
+    """
+        Raises ImproperlyConfigured if the tegro tables are placed on another database or have a replica,
+        but TegroMoneyRouter isn't in DATABASE_ROUTERS: transactions on TEGRO_MONEY_DATABASE wouldn't cover
+        the queries, which go to 'default'
+    """
+    if TEGRO_MONEY_DATABASE == 'default' and not TEGRO_MONEY_REPLICA_DATABASE:
+        return
+    if not any(isinstance(database_router, TegroMoneyRouter) for database_router in router.routers):
+        raise ImproperlyConfigured("TEGRO_MONEY_DATABASE and TEGRO_MONEY_REPLICA_DATABASE require "
+                                   "'django_tegro_money.routers.TegroMoneyRouter' in DATABASE_ROUTERS")
+
+
+@contextmanager
+def replica_reads():
+    """
+        Routes the reads of the tegro tables inside the block to the replica
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class TegroMoneyRouter:
+    """
+        Add to DATABASE_ROUTERS: 'django_tegro_money.routers.TegroMoneyRouter'
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        if _replica_reads.get():
+            return get_read_database()
+        return TEGRO_MONEY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        mark_written()
+        return TEGRO_MONEY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == APP_LABEL and obj2._meta.app_label == APP_LABEL:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == APP_LABEL:
+            return db == TEGRO_MONEY_DATABASE
+        if db in (TEGRO_MONEY_DATABASE, TEGRO_MONEY_REPLICA_DATABASE) and db != 'default':
+            return False
+        return None
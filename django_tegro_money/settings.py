@@ -4,3 +4,42 @@ from django.conf import settings
 TEGRO_MONEY_SHOP_ID = getattr(settings, 'TEGRO_MONEY_SHOP_ID', '')
 TEGRO_MONEY_SECRET_KEY = getattr(settings, 'TEGRO_MONEY_SECRET_KEY', '')
 TEGRO_MONEY_API_KEY = getattr(settings, 'TEGRO_MONEY_API_KEY', '')
+
+TEGRO_MONEY_CACHE_ALIAS = getattr(settings, 'TEGRO_MONEY_CACHE_ALIAS', 'default')
+TEGRO_MONEY_STATUS_CACHE_TIMEOUT = getattr(settings, 'TEGRO_MONEY_STATUS_CACHE_TIMEOUT', 86400)
+TEGRO_MONEY_WAIT_TIMEOUT = getattr(settings, 'TEGRO_MONEY_WAIT_TIMEOUT', 25)
+TEGRO_MONEY_WAIT_POLL_INTERVAL = getattr(settings, 'TEGRO_MONEY_WAIT_POLL_INTERVAL', 1)
+
+# Outbound rate limit of Tegro Money API requests shared by all workers through the cache,
+# disabled by default: {'rate': requests per second, 'burst': max requests at once}
+TEGRO_MONEY_RATE_LIMIT = getattr(settings, 'TEGRO_MONEY_RATE_LIMIT', None)
+# Per endpoint rate limits, e.g. {'orders/': {'rate': 1, 'burst': 2}}
+TEGRO_MONEY_ENDPOINT_RATE_LIMITS = getattr(settings, 'TEGRO_MONEY_ENDPOINT_RATE_LIMITS', {})
+# Max time to wait for the rate limiter before the request fails, seconds
+TEGRO_MONEY_RATE_LIMIT_MAX_WAIT = getattr(settings, 'TEGRO_MONEY_RATE_LIMIT_MAX_WAIT', 10)
+
+# Time budget of Tegro Money API calls made while handling an HTTP request, seconds,
+# set by django_tegro_money.middleware.DeadlineMiddleware
+TEGRO_MONEY_REQUEST_BUDGET = getattr(settings, 'TEGRO_MONEY_REQUEST_BUDGET', 10)
+
+# Use the async payment_status view (Django 4.1 or higher)
+TEGRO_MONEY_ASYNC_VIEWS = getattr(settings, 'TEGRO_MONEY_ASYNC_VIEWS', False)
+
+# Max number of order identities kept in the in-process cache
+TEGRO_MONEY_IDENTITY_CACHE_SIZE = getattr(settings, 'TEGRO_MONEY_IDENTITY_CACHE_SIZE', 10000)
+
+# Database alias of the tegro tables and of their read replica (None - no replica),
+# used by django_tegro_money.routers.TegroMoneyRouter
+TEGRO_MONEY_DATABASE = getattr(settings, 'TEGRO_MONEY_DATABASE', 'default')
+TEGRO_MONEY_REPLICA_DATABASE = getattr(settings, 'TEGRO_MONEY_REPLICA_DATABASE', None)
+# Reads go to the primary database for this number of seconds after a write, so writes are read back
+TEGRO_MONEY_REPLICA_STICKY_SECONDS = getattr(settings, 'TEGRO_MONEY_REPLICA_STICKY_SECONDS', 5)
+
+# Time zone of dates returned by Tegro Money API
+TEGRO_MONEY_API_TIMEZONE = getattr(settings, 'TEGRO_MONEY_API_TIMEZONE', 'UTC')
+
+# Status of paid orders posted to the ledger
+TEGRO_MONEY_PAID_STATUS = getattr(settings, 'TEGRO_MONEY_PAID_STATUS', 1)
+# Max time between creation and payment of an order, seconds. Reconciliation drill-down checks orders
+# created this time before the drift window, as they may have been paid in it
+TEGRO_MONEY_PAYMENT_LOOKBACK = getattr(settings, 'TEGRO_MONEY_PAYMENT_LOOKBACK', 86400)
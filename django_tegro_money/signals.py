@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+# Sent after the status of a TegroMoneyOrder has been changed and committed.
+# Sender: TegroMoneyOrder class
+# Arguments: instance, old_status, new_status
+# old_status is the status of the row before the change
+order_status_changed = Signal()
+
+
+def send_order_status_changed(order, old_status, new_status):
+    """
+        Sends order_status_changed signal if the status has actually changed
+    """
+    if old_status == new_status:
+        return
+    order_status_changed.send(sender=type(order), instance=order, old_status=old_status, new_status=new_status)
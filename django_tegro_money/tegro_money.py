@@ -13,13 +13,19 @@ import requests
 from django.db import transaction
 from requests import JSONDecodeError
 
-from django_tegro_money.exceptions import FailedRequestError
+from django_tegro_money.deadline import get_deadline, remaining
+from django_tegro_money.exceptions import FailedRequestError, DeadlineExceededError
 from django_tegro_money.loggers import get_logger
 from django_tegro_money.models import TegroMoneyOrder, TegroMoneyOrderFields, TegroMoneyOrderReceipt
-from django_tegro_money.settings import TEGRO_MONEY_SHOP_ID, TEGRO_MONEY_API_KEY
+from django_tegro_money.ratelimit import RateLimiter
+from django_tegro_money.responses import Order, Shop, Balance, StreamingDecoder
+from django_tegro_money.settings import TEGRO_MONEY_SHOP_ID, TEGRO_MONEY_API_KEY, TEGRO_MONEY_CACHE_ALIAS, \
+    TEGRO_MONEY_RATE_LIMIT, TEGRO_MONEY_ENDPOINT_RATE_LIMITS, TEGRO_MONEY_RATE_LIMIT_MAX_WAIT, TEGRO_MONEY_DATABASE
+from django_tegro_money.signals import send_order_status_changed
 from django_tegro_money.utils import ftod
 
 HTTP_URL = "https://tegro.money/api/"
+STREAM_CHUNK_SIZE = 65536
 
 
 class TegroMoney:
@@ -34,7 +40,8 @@ class TegroMoney:
                  log_requests: bool = False,
                  timeout: int = 10,
                  max_retries: int = 3,
-                 retry_delay: int = 3):
+                 retry_delay: int = 3,
+                 connect_timeout: float = None):
 
         if hasattr(self, 'api_key'):
             return
@@ -43,9 +50,16 @@ class TegroMoney:
         self.api_key = TEGRO_MONEY_API_KEY
         self.log_requests = log_requests
         self.timeout = timeout
+        self.connect_timeout = connect_timeout if connect_timeout is not None else timeout
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.endpoint = HTTP_URL
+        self.rate_limiter = RateLimiter(
+            cache_alias=TEGRO_MONEY_CACHE_ALIAS,
+            rate_limit=TEGRO_MONEY_RATE_LIMIT,
+            endpoint_rate_limits=TEGRO_MONEY_ENDPOINT_RATE_LIMITS,
+            max_wait=TEGRO_MONEY_RATE_LIMIT_MAX_WAIT,
+        )
 
         self.client = requests.Session()
         self.client.headers.update(
@@ -103,15 +117,47 @@ class TegroMoney:
         )
         return hash_hmac.hexdigest()
 
-    def _submit_request(self, path: str = None, data: dict = None) -> dict:
+    def _timeouts(self, deadline) -> tuple:
+        """
+            Returns connect and read timeouts sized to the time remaining to the deadline.
+        """
+
+        budget = remaining(deadline)
+        if budget is None:
+            return self.connect_timeout, self.timeout
+        return min(self.connect_timeout, budget), min(self.timeout, budget)
+
+    @staticmethod
+    def _deadline_exceeded(path, data) -> DeadlineExceededError:
+        return DeadlineExceededError(
+            request=f"POST {path}: {data}",
+            message="Deadline exceeded.",
+            status_code=408,
+            time=datetime.now(timezone.utc).strftime("%H:%M:%S"),
+            resp_headers=None,
+        )
+
+    def _retry_sleep(self, path, data, deadline):
+        # Don't sleep if there will be no time left for the next attempt.
+        budget = remaining(deadline)
+        if budget is not None and budget <= self.retry_delay:
+            raise self._deadline_exceeded(path, data)
+        time.sleep(self.retry_delay)
+
+    def _submit_request(self, path: str = None, data: dict = None, deadline: float = None, stream: bool = False):
         """
             Submits the request to the API.
+            Retries and waits stop at the deadline (absolute time.monotonic() value), if any.
+            If stream is set, returns the response with the body not read yet instead of the decoded dict.
         """
 
         if data is None:
             data = {}
 
+        shop_id = str(data.get('shop_id') or self.shop_id)
         data = self.prepare_data(data)
+        deadline = get_deadline(deadline)
+        endpoint = path[len(self.endpoint):] if path.startswith(self.endpoint) else path
 
         # Prepare signature.
         signature = self._auth(data)
@@ -135,6 +181,26 @@ class TegroMoney:
 
             retries_remaining = f"{retries_attempted} retries remain."
 
+            budget = remaining(deadline)
+            if budget is not None and budget <= 0:
+                raise self._deadline_exceeded(path, data)
+
+            # Wait for the shared rate limiter.
+            max_wait = self.rate_limiter.max_wait if budget is None else min(self.rate_limiter.max_wait, budget)
+            waited = self.rate_limiter.acquire(shop_id, endpoint, max_wait=max_wait)
+            if waited is None:
+                if max_wait < self.rate_limiter.max_wait:
+                    raise self._deadline_exceeded(path, data)
+                raise FailedRequestError(
+                    request=f"POST {path}: {data}",
+                    message="Rate limit exceeded. Waiting time exceeded maximum.",
+                    status_code=429,
+                    time=datetime.now(timezone.utc).strftime("%H:%M:%S"),
+                    resp_headers=None,
+                )
+            if waited and self.log_requests:
+                self.logger.debug(f"Request -> POST {path} delayed by rate limiter for {waited:.3f}s")
+
             # Log the request.
             if self.log_requests:
                 self.logger.debug(f"Request -> POST {path}. Body: {data}. Headers: {headers}")
@@ -143,18 +209,23 @@ class TegroMoney:
                 requests.Request('POST', path, data=data, headers=headers)
             )
 
+            # The rate limiter may have used up the budget.
+            timeouts = self._timeouts(deadline)
+            if min(timeouts) <= 0:
+                raise self._deadline_exceeded(path, data)
+
             # Attempt the request.
             try:
-                response = self.client.send(request, timeout=self.timeout)
+                response = self.client.send(request, timeout=timeouts, stream=stream)
 
             # If requests fires an error, retry.
             except (
-                requests.exceptions.ReadTimeout,
+                requests.exceptions.Timeout,
                 requests.exceptions.SSLError,
                 requests.exceptions.ConnectionError,
             ) as e:
                 self.logger.error(f"{e}. {retries_remaining}")
-                time.sleep(self.retry_delay)
+                self._retry_sleep(path, data, deadline)
                 continue
 
             # Check HTTP status code before trying to decode JSON.
@@ -173,6 +244,13 @@ class TegroMoney:
                     resp_headers=response.headers,
                 )
 
+            # The body is decoded by the caller.
+            if stream:
+                if self.log_requests:
+                    self.logger.debug(f"Response elapsed: {response.elapsed}. "
+                                      f"Response headers: {response.headers}")
+                return response
+
             # Convert response to dictionary, or raise if requests error.
             try:
                 response_json = response.json()
@@ -180,7 +258,7 @@ class TegroMoney:
             # If we have trouble converting, handle the error and retry.
             except JSONDecodeError as e:
                 self.logger.error(f"{e}. {retries_remaining}")
-                time.sleep(self.retry_delay)
+                self._retry_sleep(path, data, deadline)
                 continue
 
             ret_code = "type"
@@ -190,7 +268,7 @@ class TegroMoney:
             if response_json[ret_code] != 'success':
                 self.logger.error(f"{response_json[ret_msg]} (Type: {response_json[ret_code]}). "
                                   f"{retries_remaining}")
-                time.sleep(self.retry_delay)
+                self._retry_sleep(path, data, deadline)
                 continue
 
             else:
@@ -201,7 +279,7 @@ class TegroMoney:
 
                 return response_json
 
-    def create_order(self, **kwargs) -> dict:
+    def create_order(self, deadline: float = None, **kwargs) -> dict:
         """
             Method for obtaining a direct link to pay for an order
             Required args:
@@ -211,6 +289,8 @@ class TegroMoney:
                 payment_system (integer): Payment system ID
                 fields (dict(email, phone)): Customers data
                 receipt (dict(name, count, price)): Receipt data
+            Optional args:
+                deadline (float): Absolute time.monotonic() deadline of the call
             Returns parameters for request:
                 response_json (dict):
                     type (string): "success"
@@ -222,7 +302,7 @@ class TegroMoney:
                 https://tegro.money/docs/api/info/create-order/
         """
 
-        with transaction.atomic():
+        with transaction.atomic(using=TEGRO_MONEY_DATABASE):
             order = TegroMoneyOrder()
             order.shop_id = TEGRO_MONEY_SHOP_ID
             order.date_created = datetime.now(timezone.utc)
@@ -267,23 +347,29 @@ class TegroMoney:
         result = self._submit_request(
             path=f'{self.endpoint}createOrder/',
             data=kwargs,
+            deadline=deadline,
         )
 
-        with transaction.atomic():
+        with transaction.atomic(using=TEGRO_MONEY_DATABASE):
+            old_status = order.status
             order.status = 0
             if result.get('data', False):
                 order_id = result['data'].get('id', None)
                 if order_id:
                     order.order_id = int(order_id)
             order.save()
+            transaction.on_commit(lambda: send_order_status_changed(order, old_status, order.status),
+                                  using=TEGRO_MONEY_DATABASE)
 
         return result
 
-    def get_shops(self, **kwargs) -> dict:
+    def get_shops(self, deadline: float = None, **kwargs) -> dict:
         """
             Method for getting a list of your shops
             Required args:
                 none
+            Optional args:
+                deadline (float): Absolute time.monotonic() deadline of the call
             Returns parameters for request:
                 response_json (dict):
                     type (string): "success"
@@ -304,13 +390,16 @@ class TegroMoney:
         return self._submit_request(
             path=f'{self.endpoint}shops/',
             data=kwargs,
+            deadline=deadline,
         )
 
-    def get_balance(self, **kwargs) -> dict:
+    def get_balance(self, deadline: float = None, **kwargs) -> dict:
         """
             Method for getting the balance of all wallets
             Required args:
                 none
+            Optional args:
+                deadline (float): Absolute time.monotonic() deadline of the call
             Returns parameters for request:
                 response_json (dict):
                     type (string): "success"
@@ -327,14 +416,17 @@ class TegroMoney:
         return self._submit_request(
             path=f'{self.endpoint}balance/',
             data=kwargs,
+            deadline=deadline,
         )
 
-    def check_order(self, **kwargs) -> dict:
+    def check_order(self, deadline: float = None, **kwargs) -> dict:
         """
             Order information retrieval method
             Required args:
                 order_id (integer): Order number in tegro.money
                 payment_id (string): ... or Order number in your store
+            Optional args:
+                deadline (float): Absolute time.monotonic() deadline of the call
             Returns parameters for request:
                 response_json (dict):
                     type (string): "success"
@@ -357,13 +449,16 @@ class TegroMoney:
         return self._submit_request(
             path=f'{self.endpoint}order/',
             data=kwargs,
+            deadline=deadline,
         )
 
-    def get_orders(self, **kwargs) -> dict:
+    def get_orders(self, deadline: float = None, **kwargs) -> dict:
         """
             Method for obtaining information about orders
             Required args:
                 page (integer): Number of page
+            Optional args:
+                deadline (float): Absolute time.monotonic() deadline of the call
             Returns parameters for request:
                 response_json (dict):
                     type (string): "success"
@@ -389,5 +484,104 @@ class TegroMoney:
         return self._submit_request(
             path=f'{self.endpoint}orders/',
             data=kwargs,
+            deadline=deadline,
         )
 
+    def fetch_shops(self, deadline: float = None, **kwargs) -> list:
+        """
+            Typed variant of get_shops
+            Returns list of Shop
+        """
+        shops = self.get_shops(deadline=deadline, **kwargs)['data'].get('shops') or []
+        if isinstance(shops, dict):
+            shops = [shops]
+        return [Shop(shop) for shop in shops]
+
+    def fetch_balance(self, deadline: float = None, **kwargs) -> Balance:
+        """
+            Typed variant of get_balance
+            Returns Balance: user_id (int), balance (dict of Decimal by currency)
+        """
+        return Balance(self.get_balance(deadline=deadline, **kwargs)['data'])
+
+    def fetch_order(self, deadline: float = None, **kwargs) -> Order:
+        """
+            Typed variant of check_order
+            Required args:
+                order_id (integer): Order number in tegro.money
+                payment_id (string): ... or Order number in your store
+            Returns Order
+        """
+        return Order(self.check_order(deadline=deadline, **kwargs)['data'])
+
+    def _iter_content(self, response, path, data, deadline):
+        """
+            Yields chunks of the streamed body, raises DeadlineExceededError if the deadline passes while reading
+        """
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            budget = remaining(deadline)
+            if budget is not None and budget <= 0:
+                raise self._deadline_exceeded(path, data)
+            yield chunk
+
+    def iter_orders(self, deadline: float = None, **kwargs):
+        """
+            Typed variant of get_orders, the page is decoded incrementally while it is received.
+            The deadline covers reading of the body. Like get_orders the request is retried
+            on an error response or invalid json, unless orders have been yielded already.
+            Required args:
+                page (integer): Number of page
+            Yields Order
+        """
+        path = f'{self.endpoint}orders/'
+        deadline = get_deadline(deadline)
+        retries_attempted = self.max_retries
+
+        while True:
+            retries_attempted -= 1
+            response = self._submit_request(path=path, data=kwargs, deadline=deadline, stream=True)
+            decoder = StreamingDecoder(self._iter_content(response, path, kwargs, deadline))
+            yielded = False
+            error = None
+
+            with response:
+                try:
+                    for item in decoder:
+                        # "type" precedes "data" in responses of the API
+                        if decoder.fields.get('type', 'success') != 'success':
+                            break
+                        yielded = True
+                        yield Order(item)
+                except json.JSONDecodeError as e:
+                    self.logger.error(f"{e}. Response headers: {response.headers}")
+                    error = f"Invalid response json: {e}"
+
+            if error is None and decoder.fields.get('type') != 'success':
+                error = f"{decoder.fields.get('desc')} (Type: {decoder.fields.get('type')})"
+                self.logger.error(f"{error}.")
+            if error is None:
+                return
+
+            if yielded or retries_attempted <= 0:
+                raise FailedRequestError(
+                    request=f"POST {path}: {kwargs}",
+                    message=error,
+                    status_code=response.status_code,
+                    time=datetime.now(timezone.utc).strftime("%H:%M:%S"),
+                    resp_headers=response.headers,
+                )
+            self.logger.error(f"{retries_attempted} retries remain.")
+            self._retry_sleep(path, kwargs, deadline)
+
+    def iter_all_orders(self, deadline: float = None, page: int = 1, **kwargs):
+        """
+            Yields Order of all pages of get_orders starting from the page, until an empty page
+        """
+        while True:
+            count = 0
+            for order in self.iter_orders(deadline=deadline, page=page, **kwargs):
+                count += 1
+                yield order
+            if not count:
+                return
+            page += 1
@@ -1,7 +1,19 @@
+import django
 from django.urls import path
 
-from django_tegro_money.views import payment_status
+from django_tegro_money.settings import TEGRO_MONEY_ASYNC_VIEWS
+from django_tegro_money.views import payment_status, apayment_status, wait_payment_status, payment_status_events
+
+# The async ORM runs every query in a thread through sync_to_async, so the async view is slower than the sync one
+# even under ASGI (see benchmarks/payment_status_burst.py) and is only used when chosen explicitly.
+# The async ORM (aupdate) is available since Django 4.1
+use_async_views = bool(TEGRO_MONEY_ASYNC_VIEWS) and django.VERSION >= (4, 1)
 
 urlpatterns = [
-    path('payment_status/', payment_status, name='payment_status'),
+    path('payment_status/', apayment_status if use_async_views else payment_status, name='payment_status'),
+    path('payment_status/wait/', wait_payment_status, name='wait_payment_status'),
 ]
+
+# StreamingHttpResponse accepts async iterators since Django 4.2
+if django.VERSION >= (4, 2):
+    urlpatterns.append(path('payment_status/events/', payment_status_events, name='payment_status_events'))
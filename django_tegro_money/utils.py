@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from decimal import Decimal
 
 
@@ -8,3 +10,40 @@ def ftod(value, precision=15):
     if value is None:
         value = 0.00
     return Decimal(value).quantize(Decimal(10) ** -precision)
+
+
+class LRUCache:
+    """
+        Thread-safe bounded in-process cache, the least recently used items are evicted first
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -1,10 +1,46 @@
+import asyncio
 import json
+import math
+import time
 
+from asgiref.sync import sync_to_async
+from django.core.signing import BadSignature
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from django_tegro_money.identity import order_identity
 from django_tegro_money.models import TegroMoneyOrder
+from django_tegro_money.notifications import read_wait_token, wait_order_status
+from django_tegro_money.settings import TEGRO_MONEY_SHOP_ID, TEGRO_MONEY_WAIT_TIMEOUT, TEGRO_MONEY_DATABASE
+from django_tegro_money.signals import send_order_status_changed
+
+
+def _parse_payment_status(body):
+    """
+        Parses the notification of Tegro Money.
+        Returns (shop_id, order_id, status) or the error response.
+    """
+
+    try:
+        data = json.loads(body)
+    except Exception as e:
+        return JsonResponse({'type': 'error', 'desc': f'Invalid request json: {e}'}, status=400)
+
+    shop_id = data.get('shop_id')
+    order_id = data.get('order_id')
+    status = data.get('status')
+
+    if shop_id is None or order_id is None or status is None:
+        return JsonResponse({'type': 'error', 'desc': 'Invalid request: shop_id, order_id, status are expected'},
+                            status=400)
+
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return JsonResponse({'type': 'error', 'desc': 'Invalid request: status must be integer'}, status=400)
+
+    return shop_id, order_id, status
 
 
 @csrf_exempt
@@ -12,37 +48,185 @@ def payment_status(request):
 
     if request.method == 'POST':
 
-        try:
-            data = json.load(request)
-        except Exception as e:
-            return JsonResponse({'type': 'error', 'desc': f'Invalid request json: {e}'}, status=400)
-
-        shop_id = data.get('shop_id')
-        order_id = data.get('order_id')
-        status = data.get('status')
-        amount = data.get('amount')
-        payment_system = data.get('payment_system')
-        currency = data.get('currency')
-        test = data.get('test')
-        sign = data.get('sign')
+        parsed = _parse_payment_status(request.body)
+        if isinstance(parsed, JsonResponse):
+            return parsed
+        shop_id, order_id, new_status = parsed
 
-        if shop_id is not None and order_id is not None and status is not None:
+        identity = order_identity.get_by_order_id(shop_id, order_id)
+        if identity is None:
+            return JsonResponse({'type': 'error', 'desc': 'order not found'}, status=404)
+        if identity.status == new_status:
+            # Repeated notification: the cached status is dropped by every other change of the order
+            return JsonResponse({'type': 'success', 'desc': ''}, status=200)
 
-            orders = TegroMoneyOrder.objects.filter(shop_id=shop_id, order_id=order_id)
-            if len(orders) != 1:
+        # Compare-and-update: the row is only updated if its status is still the one read,
+        # so the old status sent with the signal is the real previous one. Unlike select_for_update()
+        # the lock isn't upgraded from a read to a write, which fails at once on SQLite
+        while True:
+            order = TegroMoneyOrder.objects.filter(pk=identity.pk).first()
+            if order is None:
                 return JsonResponse({'type': 'error', 'desc': 'order not found'}, status=404)
+            old_status = order.status
+            if old_status == new_status:
+                if identity.status != new_status:
+                    # The cached status is stale
+                    order_identity.set_status(identity.pk, new_status)
+                break
+            with transaction.atomic(using=TEGRO_MONEY_DATABASE):
+                updated = TegroMoneyOrder.objects.filter(pk=identity.pk, status=old_status).update(status=new_status)
+                if updated:
+                    order.status = new_status
+                    transaction.on_commit(lambda: send_order_status_changed(order, old_status, new_status),
+                                          using=TEGRO_MONEY_DATABASE)
+            if updated:
+                break
+
+        return JsonResponse({'type': 'success', 'desc': ''}, status=200)
 
-            order = orders[0]
+    else:
+        return JsonResponse({'type': 'error', 'desc': 'Invalid request: method must be POST'}, status=400)
+
+
+async def apayment_status(request):
+    """
+        Async variant of payment_status for ASGI deployments, requires Django 4.1 or higher
+    """
+
+    if request.method == 'POST':
 
-            with transaction.atomic():
-                order.status = status
-                order.save()
+        # The body has already been read by the ASGI handler, parsing doesn't block
+        parsed = _parse_payment_status(request.body)
+        if isinstance(parsed, JsonResponse):
+            return parsed
+        shop_id, order_id, new_status = parsed
 
+        identity = await order_identity.aget_by_order_id(shop_id, order_id)
+        if identity is None:
+            return JsonResponse({'type': 'error', 'desc': 'order not found'}, status=404)
+        if identity.status == new_status:
             return JsonResponse({'type': 'success', 'desc': ''}, status=200)
 
-        else:
-            return JsonResponse({'type': 'error', 'desc': 'Invalid request: shop_id, order_id, status are expected'},
-                                status=400)
+        # Compare-and-update: the row is only updated if its status is still the one read,
+        # so the old status sent with the signal is the real previous one
+        while True:
+            order = await TegroMoneyOrder.objects.filter(pk=identity.pk).afirst()
+            if order is None:
+                return JsonResponse({'type': 'error', 'desc': 'order not found'}, status=404)
+            old_status = order.status
+            if old_status == new_status:
+                if identity.status != new_status:
+                    # The cached status is stale
+                    await sync_to_async(order_identity.set_status)(identity.pk, new_status)
+                break
+            if await TegroMoneyOrder.objects.filter(pk=identity.pk, status=old_status).aupdate(status=new_status):
+                order.status = new_status
+                # Receivers use the sync ORM, so they run in the thread of the request
+                await sync_to_async(send_order_status_changed)(order, old_status, new_status)
+                break
+
+        return JsonResponse({'type': 'success', 'desc': ''}, status=200)
 
     else:
         return JsonResponse({'type': 'error', 'desc': 'Invalid request: method must be POST'}, status=400)
+
+
+# csrf_exempt() wraps views in a sync function before Django 5.0, so the flag is set directly
+apayment_status.csrf_exempt = True
+
+
+def _parse_wait_request(params):
+    """
+        Parses GET parameters of the waiting views: order_id (from the token), last known status and timeout
+    """
+    order_id = read_wait_token(params['token'])
+    known_status = params.get('status')
+    if known_status is not None and known_status != '':
+        known_status = int(known_status)
+    else:
+        known_status = None
+    timeout = float(params.get('timeout', TEGRO_MONEY_WAIT_TIMEOUT))
+    if not math.isfinite(timeout):
+        raise ValueError('timeout must be a finite number')
+    return order_id, known_status, min(max(timeout, 0), TEGRO_MONEY_WAIT_TIMEOUT)
+
+
+async def _wait_status_change(order_id, known_status, deadline):
+    """
+        Waits until the status of the order differs from the known one or the deadline comes.
+        Returns the current status, None if the order is not found.
+    """
+    try:
+        return await wait_order_status(TEGRO_MONEY_SHOP_ID, order_id, known_status, max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        if known_status is None:
+            # The status hasn't been read yet
+            identity = await sync_to_async(order_identity.get_by_order_id)(TEGRO_MONEY_SHOP_ID, order_id)
+            return None if identity is None else identity.status
+        return known_status
+
+
+async def wait_for_payment_status(params) -> tuple:
+    """
+        Long-poll: waits until the status of the order differs from the known one.
+        Returns the HTTP status and the data of the response, see wait_payment_status
+    """
+    try:
+        order_id, known_status, timeout = _parse_wait_request(params)
+    except (KeyError, ValueError, BadSignature) as e:
+        return 400, {'type': 'error', 'desc': f'Invalid request: {e}'}
+
+    status = await _wait_status_change(order_id, known_status, time.monotonic() + timeout)
+    if status is None:
+        return 404, {'type': 'error', 'desc': 'order not found'}
+
+    return 200, {'type': 'success', 'desc': '',
+                 'data': {'order_id': order_id, 'status': status, 'changed': status != known_status}}
+
+
+async def wait_payment_status(request):
+    """
+        Long-poll view: returns the status of the order as soon as it differs from the known one
+        GET parameters:
+            token (string): Token of the order, see notifications.make_wait_token
+            status (integer, optional): Last status known to the client
+            timeout (number, optional): Max waiting time, seconds
+    """
+
+    if request.method != 'GET':
+        return JsonResponse({'type': 'error', 'desc': 'Invalid request: method must be GET'}, status=400)
+
+    status, data = await wait_for_payment_status(request.GET)
+    return JsonResponse(data, status=status)
+
+
+async def payment_status_events(request):
+    """
+        Server-Sent Events view: streams every status change of the order until the timeout
+        GET parameters are the same as for wait_payment_status
+    """
+
+    if request.method != 'GET':
+        return JsonResponse({'type': 'error', 'desc': 'Invalid request: method must be GET'}, status=400)
+
+    try:
+        order_id, known_status, timeout = _parse_wait_request(request.GET)
+    except (KeyError, ValueError, BadSignature) as e:
+        return JsonResponse({'type': 'error', 'desc': f'Invalid request: {e}'}, status=400)
+
+    async def events():
+        status = known_status
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            new_status = await _wait_status_change(order_id, status, deadline)
+            if new_status is None:
+                yield 'event: error\ndata: {"desc": "order not found"}\n\n'
+                return
+            if new_status != status:
+                status = new_status
+                yield f'event: status\ndata: {json.dumps({"order_id": order_id, "status": status})}\n\n'
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -33,10 +33,13 @@ setup(
         "Framework :: Django",
     ],
     keywords="tegro money api connector",
-    packages=["django_tegro_money", "django_tegro_money.migrations", ],
+    packages=["django_tegro_money", "django_tegro_money.migrations", "django_tegro_money.management",
+              "django_tegro_money.management.commands", ],
     python_requires=">=3.8",
     install_requires=[
         "requests",
         "django",
+        "asgiref>=3.6",
+        "backports.zoneinfo; python_version<'3.9'",
     ],
 )
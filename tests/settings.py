@@ -0,0 +1,32 @@
+SECRET_KEY = 'django-tegro-money-tests'
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'django_tegro_money',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dummy': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+ROOT_URLCONF = 'django_tegro_money.urls'
+
+USE_TZ = True
+
+TEGRO_MONEY_SHOP_ID = 'SHOP'
+TEGRO_MONEY_SECRET_KEY = 'secret'
+TEGRO_MONEY_API_KEY = 'key'
+TEGRO_MONEY_WAIT_POLL_INTERVAL = 0.1
@@ -0,0 +1,84 @@
+import time
+from unittest import TestCase, mock
+
+import requests
+
+from django_tegro_money.deadline import deadline_after, get_deadline
+from django_tegro_money.exceptions import DeadlineExceededError
+from django_tegro_money.tegro_money import TegroMoney
+
+
+def success_response():
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {'type': 'success', 'desc': '', 'data': {'id': 1}}
+    return response
+
+
+class DeadlineTest(TestCase):
+
+    def setUp(self):
+        self.tegro_money = TegroMoney()
+        patches = [
+            mock.patch.object(self.tegro_money.client, 'send', return_value=success_response()),
+            mock.patch.object(self.tegro_money.rate_limiter, 'acquire', return_value=0),
+            mock.patch.object(self.tegro_money, 'timeout', 10),
+            mock.patch.object(self.tegro_money, 'connect_timeout', 5),
+            mock.patch.object(self.tegro_money, 'retry_delay', 3),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.send = self.tegro_money.client.send
+        self.acquire = self.tegro_money.rate_limiter.acquire
+
+    def test_timeouts_without_deadline(self):
+        self.tegro_money.check_order(order_id=1)
+        self.assertEqual(self.send.call_args.kwargs['timeout'], (5, 10))
+
+    def test_timeouts_sized_to_deadline(self):
+        self.tegro_money.check_order(order_id=1, deadline=time.monotonic() + 2)
+        connect_timeout, read_timeout = self.send.call_args.kwargs['timeout']
+        self.assertTrue(0 < connect_timeout <= 2)
+        self.assertTrue(0 < read_timeout <= 2)
+
+    def test_deadline_passed(self):
+        with self.assertRaises(DeadlineExceededError) as cm:
+            self.tegro_money.check_order(order_id=1, deadline=time.monotonic() - 1)
+        self.assertEqual(cm.exception.status_code, 408)
+        self.send.assert_not_called()
+        self.acquire.assert_not_called()
+
+    def test_rate_limiter_uses_up_budget(self):
+        def acquire(shop_id, endpoint, max_wait=None):
+            time.sleep(max_wait + 0.01)
+            return max_wait + 0.01
+        self.acquire.side_effect = acquire
+
+        with self.assertRaises(DeadlineExceededError):
+            self.tegro_money.check_order(order_id=1, deadline=time.monotonic() + 0.05)
+        self.send.assert_not_called()
+
+    def test_rate_limiter_wait_is_limited_by_deadline(self):
+        self.acquire.return_value = None
+        with self.assertRaises(DeadlineExceededError):
+            self.tegro_money.check_order(order_id=1, deadline=time.monotonic() + 1)
+        self.assertLessEqual(self.acquire.call_args.kwargs['max_wait'], 1)
+
+    def test_no_retry_after_deadline(self):
+        self.send.side_effect = requests.exceptions.ConnectionError('Connection refused')
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            self.tegro_money.check_order(order_id=1, deadline=started + 1)
+        # Doesn't sleep for retry_delay when no time would be left for the next attempt
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_deadline_of_context(self):
+        with deadline_after(60) as outer:
+            with deadline_after(120) as inner:
+                self.assertEqual(inner, outer)
+                self.assertEqual(get_deadline(), outer)
+            with deadline_after(-1):
+                with self.assertRaises(DeadlineExceededError):
+                    self.tegro_money.check_order(order_id=1)
+        self.assertIsNone(get_deadline())
@@ -0,0 +1,69 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from django_tegro_money.identity import order_identity, OrderIdentity
+from django_tegro_money.models import TegroMoneyOrder
+
+
+class OrderIdentityCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        order_identity.local.clear()
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, payment_id='A', status=0)
+
+    def test_get_by_order_id(self):
+        self.assertEqual(order_identity.get_by_order_id('SHOP', 1), OrderIdentity(self.order.pk, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(order_identity.get_by_order_id('SHOP', 1), OrderIdentity(self.order.pk, 0))
+        self.assertIsNone(order_identity.get_by_order_id('SHOP', 2))
+        self.assertIsNone(order_identity.get_by_order_id('OTHER', 1))
+
+    def test_get_many_by_order_id(self):
+        other = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=2, status=1)
+        order_identity.get_by_order_id('SHOP', 1)
+        with self.assertNumQueries(1):
+            identities = order_identity.get_many_by_order_id('SHOP', [1, 2, 3])
+        self.assertEqual(identities, {1: OrderIdentity(self.order.pk, 0), 2: OrderIdentity(other.pk, 1)})
+        with self.assertNumQueries(0):
+            self.assertEqual(order_identity.get_many_by_order_id('SHOP', [1, 2]), identities)
+
+    def test_get_by_payment_id(self):
+        self.assertEqual(order_identity.get_by_payment_id('SHOP', 'A'), OrderIdentity(self.order.pk, 0))
+        with self.assertNumQueries(0):
+            order_identity.get_by_payment_id('SHOP', 'A')
+
+        # payment_id isn't unique any more
+        other = TegroMoneyOrder.objects.create(shop_id='SHOP', payment_id='A', status=0)
+        order_identity.set(other)
+        self.assertIsNone(order_identity.get_by_payment_id('SHOP', 'A'))
+
+    def test_set_status(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        order_identity.set_status(self.order.pk, 1)
+        self.assertEqual(order_identity.get_by_order_id('SHOP', 1).status, 1)
+
+    def test_invalidate(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        TegroMoneyOrder.objects.filter(pk=self.order.pk).update(status=1)
+        order_identity.invalidate(self.order)
+        self.assertEqual(order_identity.get_by_order_id('SHOP', 1).status, 1)
+
+    def test_dropped_on_save(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        self.order.status = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        self.assertEqual(order_identity.get_by_order_id('SHOP', 1).status, 1)
+
+    def test_kept_on_save_of_other_fields(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.order.save(update_fields=['fee'])
+        self.assertEqual(callbacks, [])
+
+    def test_dropped_on_delete(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertIsNone(order_identity.get_by_order_id('SHOP', 1))
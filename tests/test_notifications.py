@@ -0,0 +1,264 @@
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+
+import django
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, AsyncClient, AsyncRequestFactory
+from django.urls import reverse
+
+from django_tegro_money.asgi import with_wait_payment_status
+from django_tegro_money.identity import order_identity
+from django_tegro_money.models import TegroMoneyOrder
+from django_tegro_money.notifications import make_wait_token, publish_order_status, status_waiters, \
+    wait_order_status
+from django_tegro_money.signals import order_status_changed
+from django_tegro_money.views import apayment_status
+
+
+def clear_caches():
+    caches['default'].clear()
+    order_identity.local.clear()
+
+
+class StatusChangedSignalTest(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, status=0)
+        self.changes = []
+        order_status_changed.connect(self.receiver)
+        self.addCleanup(order_status_changed.disconnect, self.receiver)
+
+    def receiver(self, sender, instance, old_status, new_status, **kwargs):
+        self.changes.append((instance.pk, old_status, new_status))
+
+    def notify(self, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('payment_status'), json.dumps(
+                {'shop_id': 'SHOP', 'order_id': 1, 'status': status}), content_type='application/json')
+
+    def test_status_change(self):
+        self.assertEqual(self.notify(1).status_code, 200)
+        self.assertEqual(self.changes, [(self.order.pk, 0, 1)])
+        self.assertEqual(order_identity.get_by_order_id('SHOP', 1).status, 1)
+
+    def test_repeated_notification(self):
+        self.notify(1)
+        self.notify(1)
+        self.assertEqual(self.changes, [(self.order.pk, 0, 1)])
+
+    def test_repeated_notification_doesnt_query(self):
+        self.notify(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.notify(1).status_code, 200)
+
+    def test_old_status_is_the_status_of_the_row(self):
+        self.notify(1)
+        # Changed bypassing the signals, the cached status is stale
+        TegroMoneyOrder.objects.filter(pk=self.order.pk).update(status=2)
+        self.notify(3)
+        self.assertEqual(self.changes[-1], (self.order.pk, 2, 3))
+
+    def test_unknown_order(self):
+        response = self.client.post(reverse('payment_status'), json.dumps(
+            {'shop_id': 'SHOP', 'order_id': 2, 'status': 1}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.changes, [])
+
+
+class AsyncStatusChangedSignalTest(TransactionTestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, status=0)
+        self.changes = []
+        self.threads = []
+        order_status_changed.connect(self.receiver)
+        self.addCleanup(order_status_changed.disconnect, self.receiver)
+
+    def receiver(self, sender, instance, old_status, new_status, **kwargs):
+        self.changes.append((instance.pk, old_status, new_status))
+        self.threads.append(threading.current_thread())
+
+    async def notify(self, status, order_id=1):
+        request = AsyncRequestFactory().post('/payment_status/', json.dumps(
+            {'shop_id': 'SHOP', 'order_id': order_id, 'status': status}), content_type='application/json')
+        return await apayment_status(request)
+
+    async def test_status_change(self):
+        self.assertEqual((await self.notify(1)).status_code, 200)
+        self.assertEqual(self.changes, [(self.order.pk, 0, 1)])
+        self.assertEqual((await order_identity.aget_by_order_id('SHOP', 1)).status, 1)
+
+    async def test_receivers_run_in_the_thread_of_the_request(self):
+        await self.notify(1)
+        # Thread-sensitive code of a request outside of ASGIHandler runs in the main thread
+        self.assertEqual(self.threads, [threading.main_thread()])
+
+    async def test_repeated_notification(self):
+        await self.notify(1)
+        await self.notify(1)
+        self.assertEqual(self.changes, [(self.order.pk, 0, 1)])
+
+    async def test_old_status_is_the_status_of_the_row(self):
+        await self.notify(1)
+        await TegroMoneyOrder.objects.filter(pk=self.order.pk).aupdate(status=2)
+        await self.notify(3)
+        self.assertEqual(self.changes[-1], (self.order.pk, 2, 3))
+
+    async def test_stale_cached_status(self):
+        await self.notify(1)
+        await TegroMoneyOrder.objects.filter(pk=self.order.pk).aupdate(status=2)
+        await self.notify(2)
+        self.assertEqual(len(self.changes), 1)
+        self.assertEqual((await order_identity.aget_by_order_id('SHOP', 1)).status, 2)
+
+    async def test_unknown_order(self):
+        self.assertEqual((await self.notify(1, order_id=2)).status_code, 404)
+        self.assertEqual(self.changes, [])
+
+
+class StatusWaitersTest(TransactionTestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, status=0)
+        order_identity.set(self.order)
+
+    async def test_current_status_differs(self):
+        self.assertEqual(await wait_order_status('SHOP', 1, None, 1), 0)
+        self.assertEqual(await wait_order_status('SHOP', 1, 5, 1), 0)
+
+    async def test_woken_by_publish(self):
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.ensure_future(wait_order_status('SHOP', 1, 0, 5))
+        await asyncio.sleep(0.2)
+        self.assertFalse(waiter.done())
+
+        # Published by a sync view running in a worker thread
+        started = time.monotonic()
+        await loop.run_in_executor(None, status_waiters.publish, 'SHOP', 1, 1)
+        self.assertEqual(await waiter, 1)
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    async def test_change_by_other_worker(self):
+        waiter = asyncio.ensure_future(wait_order_status('SHOP', 1, 0, 5))
+        await asyncio.sleep(0.2)
+        # Another worker has updated the shared cache
+        order_identity.set_status(self.order.pk, 1)
+        self.assertEqual(await asyncio.wait_for(waiter, 1), 1)
+
+    async def test_unknown_order(self):
+        self.assertIsNone(await wait_order_status('SHOP', 2, None, 1))
+
+    async def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await wait_order_status('SHOP', 1, 0, 0.3)
+
+    async def test_waiters_dont_take_threads(self):
+        await wait_order_status('SHOP', 1, None, 1)
+        threads = threading.active_count()
+        with mock.patch.object(order_identity, 'get_many_by_order_id',
+                               wraps=order_identity.get_many_by_order_id) as get_many:
+            waiters = asyncio.gather(*(wait_order_status('SHOP', 1, 0, 0.5) for _ in range(200)),
+                                     return_exceptions=True)
+            await asyncio.sleep(0.3)
+            self.assertEqual(threading.active_count(), threads)
+            results = await waiters
+        self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in results))
+        # The waited orders are read together, once per poll
+        self.assertTrue(get_many.called)
+        self.assertLess(get_many.call_count, 20)
+
+
+class WaitViewsTest(TransactionTestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, status=0)
+        self.client = AsyncClient()
+        self.token = make_wait_token(1)
+
+    async def test_wait_returns_current_status(self):
+        response = await self.client.get(reverse('wait_payment_status'), {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['data'], {'order_id': 1, 'status': 0, 'changed': True})
+
+    async def test_wait_timeout(self):
+        response = await self.client.get(reverse('wait_payment_status'),
+                                         {'token': self.token, 'status': 0, 'timeout': 0.3})
+        self.assertEqual(json.loads(response.content)['data'], {'order_id': 1, 'status': 0, 'changed': False})
+
+    async def test_wait_change(self):
+        async def change():
+            await asyncio.sleep(0.2)
+            publish_order_status(self.order, 1)
+
+        changing = asyncio.ensure_future(change())
+        response = await self.client.get(reverse('wait_payment_status'),
+                                         {'token': self.token, 'status': 0, 'timeout': 5})
+        await changing
+        self.assertEqual(json.loads(response.content)['data'], {'order_id': 1, 'status': 1, 'changed': True})
+
+    async def test_wait_unknown_order(self):
+        response = await self.client.get(reverse('wait_payment_status'), {'token': make_wait_token(2)})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_wait_invalid_request(self):
+        for params in ({}, {'token': '1'}, {'token': self.token, 'timeout': 'nan'}, {'token': self.token + 'x'}):
+            with self.subTest(params=params):
+                response = await self.client.get(reverse('wait_payment_status'), params)
+                self.assertEqual(response.status_code, 400)
+
+    async def test_events(self):
+        if django.VERSION < (4, 2):
+            self.skipTest('Server-Sent Events require Django 4.2')
+
+        async def change():
+            await asyncio.sleep(0.2)
+            publish_order_status(self.order, 1)
+
+        changing = asyncio.ensure_future(change())
+        response = await self.client.get(reverse('payment_status_events'), {'token': self.token, 'timeout': 0.5})
+        events = [chunk.decode() async for chunk in response.streaming_content]
+        await changing
+        self.assertEqual(events, [
+            'event: status\ndata: {"order_id": 1, "status": 0}\n\n',
+            'event: status\ndata: {"order_id": 1, "status": 1}\n\n',
+        ])
+
+
+class WaitApplicationTest(TransactionTestCase):
+
+    def setUp(self):
+        clear_caches()
+        TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, status=0)
+        self.django_application = mock.AsyncMock()
+        self.application = with_wait_payment_status(self.django_application)
+
+    async def request(self, path, query_string=b''):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string}
+        await self.application(scope, mock.AsyncMock(), send)
+        return messages
+
+    async def test_wait(self):
+        messages = await self.request(reverse('wait_payment_status'), f'token={make_wait_token(1)}'.encode())
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(json.loads(messages[1]['body'])['data'], {'order_id': 1, 'status': 0, 'changed': True})
+        self.django_application.assert_not_called()
+
+    async def test_invalid_request(self):
+        messages = await self.request(reverse('wait_payment_status'))
+        self.assertEqual(messages[0]['status'], 400)
+
+    async def test_other_requests(self):
+        self.assertEqual(await self.request('/admin/'), [])
+        self.django_application.assert_awaited_once()
@@ -0,0 +1,123 @@
+from unittest import TestCase, mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from django_tegro_money.ratelimit import RateLimiter, PRIORITY_BACKGROUND, PRIORITY_CHECKOUT
+
+# Start of a window of 3 seconds
+NOW = 3000000.0
+
+
+class RateLimiterTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def limiter(self, **kwargs):
+        with self.assertWarns(RuntimeWarning):
+            return RateLimiter(**kwargs)
+
+    def test_disabled(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.acquire('SHOP', 'orders/'), 0)
+        self.assertEqual(limiter.metrics.snapshot(), {})
+
+    def test_invalid_limits(self):
+        for limit in ({'rate': 0, 'burst': 1}, {'rate': 1, 'burst': 0}, {'rate': 1, 'burst': 1.5}, {'rate': 1},
+                      {'rate': '1', 'burst': 1}, 5):
+            with self.subTest(limit=limit):
+                with self.assertRaises(ImproperlyConfigured):
+                    RateLimiter(rate_limit=limit)
+                with self.assertRaises(ImproperlyConfigured):
+                    RateLimiter(endpoint_rate_limits={'orders/': limit})
+
+    def test_cache_without_atomic_incr(self):
+        with self.assertRaises(ImproperlyConfigured):
+            RateLimiter(cache_alias='dummy', rate_limit={'rate': 1, 'burst': 1})
+
+    @mock.patch('django_tegro_money.ratelimit.time.time')
+    def test_take(self, now):
+        limiter = self.limiter(rate_limit={'rate': 1, 'burst': 3})
+        limit = limiter.rate_limit
+        now.return_value = NOW + 1
+        for _ in range(3):
+            key, wait = limiter._take('SHOP', limit, 3)
+            self.assertIsNotNone(key)
+            self.assertEqual(wait, 0)
+
+        key, wait = limiter._take('SHOP', limit, 3)
+        self.assertIsNone(key)
+        # Until the next window
+        self.assertAlmostEqual(wait, 2)
+        # The rejected request isn't counted
+        self.assertEqual(caches['default'].get(f'tegro_money:rate_limit:SHOP:{int(NOW // 3)}'), 3)
+
+    @mock.patch('django_tegro_money.ratelimit.time.time')
+    def test_window_boundary(self, now):
+        limiter = self.limiter(rate_limit={'rate': 1, 'burst': 3})
+        limit = limiter.rate_limit
+        now.return_value = NOW + 2.9
+        for _ in range(3):
+            self.assertEqual(limiter._take('SHOP', limit, 3)[1], 0)
+
+        # A fixed window would let 3 more requests through at once
+        now.return_value = NOW + 3.1
+        key, wait = limiter._take('SHOP', limit, 3)
+        self.assertIsNone(key)
+        self.assertAlmostEqual(wait, 0.9)
+
+        now.return_value = NOW + 4
+        self.assertEqual(limiter._take('SHOP', limit, 3)[1], 0)
+        self.assertAlmostEqual(limiter._take('SHOP', limit, 3)[1], 1)
+
+    @mock.patch('django_tegro_money.ratelimit.time.time')
+    def test_priority_shares(self, now):
+        now.return_value = NOW
+        limiter = self.limiter(rate_limit={'rate': 1, 'burst': 10})
+        for _ in range(5):
+            self.assertEqual(limiter._try_acquire('SHOP', 'orders/', PRIORITY_BACKGROUND), 0)
+        self.assertGreater(limiter._try_acquire('SHOP', 'orders/', PRIORITY_BACKGROUND), 0)
+
+        # The rest is reserved for checkout
+        for _ in range(5):
+            self.assertEqual(limiter._try_acquire('SHOP', 'createOrder/', PRIORITY_CHECKOUT), 0)
+        self.assertGreater(limiter._try_acquire('SHOP', 'createOrder/', PRIORITY_CHECKOUT), 0)
+
+        # Shops are limited separately
+        self.assertEqual(limiter._try_acquire('OTHER', 'orders/', PRIORITY_BACKGROUND), 0)
+
+    @mock.patch('django_tegro_money.ratelimit.time.time')
+    def test_endpoint_limit(self, now):
+        now.return_value = NOW
+        limiter = self.limiter(rate_limit={'rate': 1, 'burst': 10},
+                               endpoint_rate_limits={'orders/': {'rate': 1, 'burst': 1}})
+        self.assertEqual(limiter._try_acquire('SHOP', 'orders/', PRIORITY_BACKGROUND), 0)
+        self.assertGreater(limiter._try_acquire('SHOP', 'orders/', PRIORITY_BACKGROUND), 0)
+        self.assertEqual(limiter._try_acquire('SHOP', 'order/', PRIORITY_BACKGROUND), 0)
+        # The request rejected by the endpoint limit isn't counted in the shop limit
+        self.assertEqual(caches['default'].get(f'tegro_money:rate_limit:SHOP:{int(NOW // 10)}'), 2)
+
+    def test_acquire_waits(self):
+        limiter = self.limiter(rate_limit={'rate': 20, 'burst': 1})
+        self.assertEqual(limiter.acquire('SHOP', 'createOrder/'), 0)
+        waited = limiter.acquire('SHOP', 'createOrder/')
+        self.assertGreater(waited, 0)
+        self.assertLess(waited, 0.2)
+
+        metrics = limiter.metrics.snapshot()['createOrder/']
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(metrics['waiting'], 0)
+        self.assertEqual(metrics['waited'], 1)
+        self.assertEqual(metrics['rejected'], 0)
+        self.assertAlmostEqual(metrics['wait_time'], waited)
+        self.assertAlmostEqual(metrics['max_wait_time'], waited)
+
+    def test_acquire_max_wait(self):
+        limiter = self.limiter(rate_limit={'rate': 0.1, 'burst': 1}, max_wait=0.1)
+        self.assertEqual(limiter.acquire('SHOP', 'createOrder/'), 0)
+        self.assertIsNone(limiter.acquire('SHOP', 'createOrder/'))
+
+        metrics = limiter.metrics.snapshot()['createOrder/']
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(metrics['rejected'], 1)
@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from django_tegro_money.identity import order_identity
+from django_tegro_money.models import TegroMoneyOrder, TegroMoneyLedger, TegroMoneyReconciliation
+from django_tegro_money.reconciliation import Reconciler
+from django_tegro_money.responses import Balance, Order
+from django_tegro_money.settings import TEGRO_MONEY_SHOP_ID
+from django_tegro_money.tegro_money import TegroMoney
+
+
+class UpdateLedgerTest(TestCase):
+
+    def setUp(self):
+        self.reconciler = Reconciler(tegro_money=TegroMoney(), shop_id='SHOP', batch_size=2)
+
+    def create_order(self, **kwargs):
+        fields = dict(shop_id='SHOP', currency='RUB', amount=Decimal(100), fee=Decimal(4), status=1)
+        fields.update(kwargs)
+        return TegroMoneyOrder.objects.create(**fields)
+
+    def ledger(self, currency='RUB'):
+        return TegroMoneyLedger.objects.get(shop_id='SHOP', currency=currency)
+
+    def test_posts_paid_orders(self):
+        orders = [self.create_order(order_id=i) for i in range(1, 4)]
+        self.create_order(order_id=4, currency='USD', amount=Decimal(10), fee=Decimal(1))
+
+        self.assertEqual(self.reconciler.update_ledger(), 4)
+
+        self.assertEqual(self.ledger().balance, Decimal(288))
+        self.assertEqual(self.ledger().orders_count, 3)
+        self.assertEqual(self.ledger('USD').balance, Decimal(9))
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.ledger_amount, Decimal(96))
+
+        # Posted orders are not read again
+        self.assertEqual(self.reconciler.update_ledger(), 0)
+        self.assertEqual(self.ledger().balance, Decimal(288))
+
+    def test_skips_orders_not_ready(self):
+        self.create_order(order_id=1, fee=None)
+        self.create_order(order_id=2, status=0)
+        self.create_order(order_id=3, currency=None)
+
+        self.assertEqual(self.reconciler.update_ledger(), 0)
+        self.assertFalse(TegroMoneyLedger.objects.exists())
+
+    def test_unposts_orders_not_paid_any_more(self):
+        cancelled = self.create_order(order_id=1)
+        self.create_order(order_id=2)
+        self.reconciler.update_ledger()
+
+        TegroMoneyOrder.objects.filter(pk=cancelled.pk).update(status=0)
+        self.assertEqual(self.reconciler.update_ledger(), 1)
+
+        cancelled.refresh_from_db()
+        self.assertIsNone(cancelled.ledger_amount)
+        self.assertEqual(self.ledger().balance, Decimal(96))
+        self.assertEqual(self.ledger().orders_count, 1)
+
+    def test_test_orders_are_not_posted(self):
+        self.create_order(order_id=1, test_order=1)
+        self.create_order(order_id=2, test_order=None)
+        posted_test_order = self.create_order(order_id=3, test_order=1, ledger_amount=Decimal(96))
+
+        self.assertEqual(self.reconciler.update_ledger(), 2)
+
+        posted_test_order.refresh_from_db()
+        self.assertIsNone(posted_test_order.ledger_amount)
+        self.assertEqual(self.ledger().balance, Decimal(0))
+        self.assertEqual(self.ledger().orders_count, 0)
+
+
+class DriftWindowTest(TestCase):
+
+    def setUp(self):
+        self.reconciler = Reconciler(tegro_money=TegroMoney(), shop_id='SHOP')
+        self.now = datetime(2026, 1, 10, tzinfo=timezone.utc)
+
+    def reconciliation(self, days_ago, drift, currency='RUB'):
+        return TegroMoneyReconciliation.objects.create(
+            shop_id='SHOP', currency=currency, date_checked=self.now - timedelta(days=days_ago),
+            ledger_balance=Decimal(100), api_balance=Decimal(100) + drift, drift=drift)
+
+    def test_since_last_reconciliation_without_drift(self):
+        self.reconciliation(5, Decimal(0))
+        last_good = self.reconciliation(3, Decimal(0))
+        self.reconciliation(2, Decimal(5))
+        self.reconciliation(2, Decimal(0), currency='USD')
+        result = self.reconciliation(0, Decimal(5))
+
+        self.assertEqual(self.reconciler.drift_window(result), (last_good.date_checked, result.date_checked))
+
+    def test_no_reconciliation_without_drift(self):
+        self.reconciliation(2, Decimal(5))
+        result = self.reconciliation(0, Decimal(5))
+
+        self.assertEqual(self.reconciler.drift_window(result), (None, result.date_checked))
+
+    def test_drill_down_requires_start(self):
+        with self.assertRaises(ValueError):
+            self.reconciler.drill_down('RUB', None, self.now)
+
+
+class ReconcileCommandTest(TestCase):
+
+    def setUp(self):
+        TegroMoneyLedger.objects.create(shop_id=TEGRO_MONEY_SHOP_ID, currency='RUB', balance=Decimal(100))
+        self.order = TegroMoneyOrder.objects.create(
+            shop_id=TEGRO_MONEY_SHOP_ID, order_id=1, currency='RUB', status=0, amount=Decimal(5),
+            date_created=datetime(2026, 1, 5, tzinfo=timezone.utc))
+        patches = [
+            mock.patch.object(TegroMoney, 'fetch_balance',
+                              return_value=Balance({'user_id': 1, 'balance': {'RUB': '105'}})),
+            mock.patch.object(TegroMoney, 'fetch_order',
+                              return_value=Order({'id': 1, 'status': 0, 'amount': '5', 'fee': '0'})),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_drill_down_without_start(self):
+        out = StringIO()
+        call_command('tegro_money_reconcile', '--drill-down', stdout=out)
+        self.assertIn('pass --since', out.getvalue())
+        TegroMoney.fetch_order.assert_not_called()
+
+    def test_drill_down_since(self):
+        call_command('tegro_money_reconcile', '--drill-down', '--since', '2026-01-01', stdout=StringIO())
+        TegroMoney.fetch_order.assert_called_once_with(order_id=1)
+
+    def test_invalid_since(self):
+        with self.assertRaises(CommandError):
+            call_command('tegro_money_reconcile', '--drill-down', '--since', '2026-13-01', stdout=StringIO())
+
+
+class SyncOrdersTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        order_identity.local.clear()
+        self.reconciler = Reconciler(tegro_money=TegroMoney(), shop_id='SHOP')
+        self.order = TegroMoneyOrder.objects.create(shop_id='SHOP', order_id=1, payment_id='A', status=0)
+
+    def sync(self, *orders):
+        with mock.patch.object(self.reconciler, 'update_ledger'):
+            return self.reconciler.sync_orders([Order(order) for order in orders])
+
+    def test_updates_status(self):
+        differences = self.sync({'id': 1, 'payment_id': 'A', 'status': 1})
+        self.assertEqual([difference[1:] for difference in differences], [('status', 0, 1)])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 1)
+
+    def test_skips_orders_with_the_cached_status(self):
+        order_identity.get_by_order_id('SHOP', 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sync({'id': 1, 'status': 0, 'amount': '100'}), [])
+
+    def test_links_order_by_payment_id(self):
+        order = TegroMoneyOrder.objects.create(shop_id='SHOP', payment_id='B', status=0)
+        differences = self.sync({'id': 2, 'payment_id': 'B', 'status': 0})
+        self.assertEqual([difference[1:] for difference in differences], [('order_id', None, 2)])
+        order.refresh_from_db()
+        self.assertEqual(order.order_id, 2)
+
+    def test_skips_other_orders_of_the_payment_id(self):
+        self.assertEqual(self.sync({'id': 2, 'payment_id': 'A', 'status': 1}, {'id': 3, 'status': 1}), [])
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.order_id, self.order.status), (1, 0))
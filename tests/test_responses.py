@@ -0,0 +1,147 @@
+import json
+import time
+from decimal import Decimal
+from unittest import TestCase, mock
+
+from django_tegro_money.exceptions import DeadlineExceededError, FailedRequestError
+from django_tegro_money.responses import Balance, Order, StreamingDecoder
+from django_tegro_money.tegro_money import TegroMoney
+
+PAGE = {
+    'type': 'success',
+    'desc': 'Заказы',
+    'data': [
+        {'id': 1, 'amount': '100.50000000', 'email': 'покупатель@example.com', 'test_order': 0},
+        {'id': 22, 'amount': 12345.5, 'fee': None, 'desc': 'a "quoted" \\ string'},
+        [],
+        {},
+        1024,
+    ],
+    'page': 3,
+}
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamingDecoderTest(TestCase):
+
+    def test_every_chunk_size(self):
+        data = json.dumps(PAGE, ensure_ascii=False, indent=1).encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                decoder = StreamingDecoder(split(data, size))
+                self.assertEqual(list(decoder), PAGE['data'])
+                self.assertEqual(decoder.fields, {'type': 'success', 'desc': 'Заказы', 'page': 3})
+
+    def test_number_split_between_chunks(self):
+        decoder = StreamingDecoder([b'{"data": [12', b'34, 5', b'6]}'])
+        self.assertEqual(list(decoder), [1234, 56])
+
+    def test_str_chunks(self):
+        decoder = StreamingDecoder(['{"data"', ': [{"id": 1}', ']}'])
+        self.assertEqual(list(decoder), [{'id': 1}])
+
+    def test_empty(self):
+        self.assertEqual(list(StreamingDecoder([b'{}'])), [])
+        self.assertEqual(list(StreamingDecoder([b'{"data": []', b', "type": "success"}'])), [])
+
+    def test_truncated(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(StreamingDecoder([b'{"data": [{"id": 1}, {"id"']))
+
+
+class RecordTest(TestCase):
+
+    def test_raw_keeps_present_keys(self):
+        order = Order({'id': 1, 'amount': '100.50000000', 'status': 1, 'unknown': 'x'})
+        self.assertEqual(order.amount, Decimal('100.5'))
+        self.assertEqual(order.raw, {'id': 1, 'amount': '100.50000000', 'status': 1, 'unknown': 'x'})
+
+    def test_invalid_value_is_kept_in_extra(self):
+        order = Order({'id': 1, 'amount': 'n/a'})
+        self.assertIsNone(order.amount)
+        self.assertEqual(order['amount'], 'n/a')
+
+    def test_empty_balance_array(self):
+        balance = Balance({'user_id': 1, 'balance': []})
+        self.assertEqual(balance.balance, {})
+
+    def test_balance(self):
+        balance = Balance({'user_id': 1, 'balance': {'RUB': '10.00000000', 'USD': 2.5}})
+        self.assertEqual(balance.balance, {'RUB': Decimal(10), 'USD': Decimal('2.5')})
+        self.assertEqual(Balance(balance.raw), balance)
+
+    def test_invalid_balance_is_kept_in_extra(self):
+        balance = Balance({'user_id': 1, 'balance': 'n/a'})
+        self.assertIsNone(balance.balance)
+        self.assertEqual(balance.extra, {'balance': 'n/a'})
+
+
+def streamed_response(data: dict, delay=0):
+    def iter_content(chunk_size):
+        for chunk in split(json.dumps(data).encode('utf-8'), 16):
+            time.sleep(delay)
+            yield chunk
+
+    response = mock.MagicMock(status_code=200, headers={})
+    response.iter_content.side_effect = iter_content
+    return response
+
+
+class IterOrdersTest(TestCase):
+
+    def setUp(self):
+        self.tegro_money = TegroMoney()
+        patches = [
+            mock.patch.object(self.tegro_money.client, 'send'),
+            mock.patch.object(self.tegro_money.rate_limiter, 'acquire', return_value=0),
+            mock.patch.object(self.tegro_money, 'max_retries', 3),
+            mock.patch.object(self.tegro_money, 'retry_delay', 0),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.send = self.tegro_money.client.send
+
+    def test_orders(self):
+        self.send.return_value = streamed_response({'type': 'success', 'desc': '', 'data': [{'id': 1}, {'id': 2}]})
+        self.assertEqual([order.id for order in self.tegro_money.iter_orders(page=1)], [1, 2])
+
+    def test_error_response_is_retried(self):
+        self.send.side_effect = [
+            streamed_response({'type': 'error', 'desc': 'Try later', 'data': []}),
+            streamed_response({'type': 'success', 'desc': '', 'data': [{'id': 1}]}),
+        ]
+        self.assertEqual([order.id for order in self.tegro_money.iter_orders(page=1)], [1])
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_retries_exceeded(self):
+        self.send.side_effect = lambda *args, **kwargs: streamed_response({'type': 'error', 'desc': 'Try later'})
+        with self.assertRaises(FailedRequestError) as cm:
+            list(self.tegro_money.iter_orders(page=1))
+        self.assertEqual(cm.exception.message, 'Try later (Type: error)')
+        self.assertEqual(self.send.call_count, 3)
+
+    def test_invalid_json_is_retried(self):
+        invalid = streamed_response({})
+        invalid.iter_content.side_effect = lambda chunk_size: iter([b'{"type": "success", "data": [{"id"'])
+        self.send.side_effect = [invalid, streamed_response({'type': 'success', 'desc': '', 'data': [{'id': 1}]})]
+        self.assertEqual([order.id for order in self.tegro_money.iter_orders(page=1)], [1])
+
+    def test_error_after_orders_is_not_retried(self):
+        self.send.return_value = streamed_response({'data': [{'id': 1}], 'type': 'error', 'desc': 'Failed'})
+        orders = []
+        with self.assertRaises(FailedRequestError):
+            for order in self.tegro_money.iter_orders(page=1):
+                orders.append(order.id)
+        self.assertEqual(orders, [1])
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_deadline_while_reading(self):
+        self.send.return_value = streamed_response(
+            {'type': 'success', 'desc': '', 'data': [{'id': i} for i in range(100)]}, delay=0.01)
+        with self.assertRaises(DeadlineExceededError):
+            list(self.tegro_money.iter_orders(page=1, deadline=time.monotonic() + 0.1))
+        self.send.return_value.__exit__.assert_called_once()
@@ -0,0 +1,66 @@
+from unittest import TestCase, mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router
+
+from django_tegro_money import routers
+from django_tegro_money.models import TegroMoneyOrder
+from django_tegro_money.routers import TegroMoneyRouter, check_router, replica_reads
+
+
+@mock.patch.multiple(routers, TEGRO_MONEY_DATABASE='payments', TEGRO_MONEY_REPLICA_DATABASE='payments_replica')
+class TegroMoneyRouterTest(TestCase):
+
+    def setUp(self):
+        self.router = TegroMoneyRouter()
+
+    def test_writes_and_reads_go_to_the_primary(self):
+        self.assertEqual(self.router.db_for_write(TegroMoneyOrder), 'payments')
+        self.assertEqual(self.router.db_for_read(TegroMoneyOrder), 'payments')
+
+    def test_other_apps_are_not_routed(self):
+        self.assertIsNone(self.router.db_for_write(User))
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(User))
+
+    @mock.patch('django_tegro_money.routers.TEGRO_MONEY_REPLICA_STICKY_SECONDS', 5)
+    def test_replica_reads(self):
+        with mock.patch('django_tegro_money.routers.time.monotonic', return_value=1000):
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(TegroMoneyOrder), 'payments_replica')
+                # Reads stick to the primary after a write
+                self.router.db_for_write(TegroMoneyOrder)
+                self.assertEqual(self.router.db_for_read(TegroMoneyOrder), 'payments')
+
+        with mock.patch('django_tegro_money.routers.time.monotonic', return_value=1006):
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(TegroMoneyOrder), 'payments_replica')
+
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate('payments', 'django_tegro_money'))
+        self.assertFalse(self.router.allow_migrate('default', 'django_tegro_money'))
+        self.assertFalse(self.router.allow_migrate('payments_replica', 'django_tegro_money'))
+        self.assertFalse(self.router.allow_migrate('payments', 'auth'))
+        self.assertIsNone(self.router.allow_migrate('default', 'auth'))
+
+
+class CheckRouterTest(TestCase):
+
+    def test_default_database(self):
+        with mock.patch.object(router, 'routers', []):
+            check_router()
+
+    @mock.patch.multiple(routers, TEGRO_MONEY_DATABASE='payments', TEGRO_MONEY_REPLICA_DATABASE=None)
+    def test_dedicated_database(self):
+        with mock.patch.object(router, 'routers', []):
+            with self.assertRaises(ImproperlyConfigured):
+                check_router()
+        with mock.patch.object(router, 'routers', [TegroMoneyRouter()]):
+            check_router()
+
+    @mock.patch('django_tegro_money.routers.TEGRO_MONEY_REPLICA_DATABASE', 'replica')
+    def test_replica(self):
+        with mock.patch.object(router, 'routers', []):
+            with self.assertRaises(ImproperlyConfigured):
+                check_router()